@@ -1,10 +1,37 @@
 """Main script to generate all plots for the data story."""
 
+import argparse
+import importlib
+import inspect
+import itertools
+import json
 import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 
-from src.utils.data import load_graph_data
+from src.utils.cache import artifact_key
+from src.utils.data import dataset_fingerprint, load_graph_data
+from src.utils.strategies.comparison import (
+	get_mixed_linear_regression_fit,
+	get_selected_model_bootstrap,
+	get_strategies_scores,
+	set_n_workers,
+)
+from src.utils.strategies.link_strategy import build_link_positions
+from src.utils.strategies.semantic_strategy import (
+	get_article_vectors,
+	get_similarity_cache,
+	load_target_similarity_matrix,
+	semantic_backend_key,
+	tf_idf_model_key,
+)
 
+from .plots import pop_written_paths, set_self_contained, write_plotlyjs
 from .plots import communities as communities_plot
 from .plots import rank_vs_length as rank_vs_length_plot
 from .plots import game_stats_intro as intro_plot
@@ -20,40 +47,236 @@ from .plots import combinations
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PLOT_MODULES = [
+	communities_plot,
+	rank_vs_length_plot,
+	intro_plot,
+	semantic_plot,
+	regression_plot,
+	hubs_plot,
+	backtrack_plot,
+	link_strat_and_comparison,
+	hubs_impact,
+	combinations,
+]
 
-def generate_all_plots() -> None:
-	"""Generate all plots for the data story."""
+# Derived inputs that plot modules can declare in an optional `INPUTS` list of names: the cached getter computing
+# each input, and the inputs it depends on. A module declares the inputs that its plots use, directly or through
+# other functions. The declared inputs are computed once, before the modules run, so that all the modules (and the
+# processes running them) share them.
+DERIVED_INPUTS: dict[str, tuple[Callable[[], object], list[str]]] = {
+	"article_vectors": (get_article_vectors, []),
+	"target_similarities": (load_target_similarity_matrix, []),
+	"link_positions": (build_link_positions, []),
+	"strategies_scores": (get_strategies_scores, ["article_vectors", "target_similarities", "link_positions"]),
+	"mixed_model_fit": (get_mixed_linear_regression_fit, ["strategies_scores"]),
+	"selected_model_bootstrap": (get_selected_model_bootstrap, ["strategies_scores"]),
+}
+
+# Manifest of the generated plots, written next to them. It records, for each HTML file, the module that wrote it
+# and the hashes of what it depends on, so that the modules whose hashes did not change are not run again
+MANIFEST_FILENAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+# Data shared with the processes generating the plots, set before they are forked
+_worker_data = {}
+
+
+def _compute_inputs(names: list[str], computed: set[str]) -> None:
+	# Compute the inputs after their dependencies, each of them once
+	for name in names:
+		if name in computed:
+			continue
+		getter, dependencies = DERIVED_INPUTS[name]
+		_compute_inputs(dependencies, computed)
+
+		start_time = time.perf_counter()
+		getter()
+		computed.add(name)
+		logger.info(f"Computed input {name} in {time.perf_counter() - start_time:.1f}s")
+
+
+def _code_hash() -> str:
+	# Hash of the code that the plots may depend on, apart from the plot modules themselves: all the loaded modules of
+	# `src` and all the modules of `src/utils` (some of them are only imported when they are used). The plot modules
+	# are hashed separately, so that editing a plot only regenerates that plot.
+	src_dir = Path(__file__).resolve().parents[2]
+	files = {Path(__file__).resolve(), *(src_dir / "utils").rglob("*.py")}
+	for name, module in list(sys.modules.items()):
+		if name.split(".")[0] == "src" and getattr(module, "__file__", None):
+			files.add(Path(module.__file__).resolve())
+	files -= {Path(inspect.getsourcefile(plot_module)).resolve() for plot_module in PLOT_MODULES}
+	return artifact_key(*[(path.relative_to(src_dir).as_posix(), path.read_text()) for path in sorted(files)])
+
+
+def _data_hash() -> str:
+	# Hash of the data that the plots depend on: the dataset, the plaintext corpus and the semantic backend
+	return artifact_key(dataset_fingerprint(), tf_idf_model_key(), semantic_backend_key())
+
+
+def _plot_hashes(plot_module, code_hash: str, data_hash: str, self_contained: bool) -> dict[str, str | bool]:
+	# Hashes of what the plots of a module depend on: its source, the rest of the code, its inputs and the data
+	return dict(
+		source=artifact_key(Path(inspect.getsourcefile(plot_module)).read_text()),
+		code=code_hash,
+		inputs=artifact_key(getattr(plot_module, "INPUTS", [])),
+		dataset=data_hash,
+		self_contained=self_contained,
+	)
+
+
+def _load_manifest(output_dir: Path) -> dict[str, dict]:
+	# Manifest entries of the HTML files, by file name
+	path = output_dir / MANIFEST_FILENAME
+	if not path.is_file():
+		return {}
+	manifest = json.loads(path.read_text())
+	return manifest["outputs"] if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def _record_outputs(manifest: dict[str, dict], output_dir: Path, module_name: str, hashes: dict, paths: list[Path]) -> None:
+	# Replace the entries of a module by the files it just wrote, and save the manifest
+	for file_name in [file_name for file_name, entry in manifest.items() if entry["module"] == module_name]:
+		del manifest[file_name]
+	for path in paths:
+		manifest[path.name] = dict(module=module_name, **hashes)
+
+	# Write to a temporary file first, so that an interrupted run never leaves a partial manifest
+	path = output_dir / MANIFEST_FILENAME
+	temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+	temporary_path.write_text(json.dumps(dict(version=MANIFEST_VERSION, outputs=manifest), indent=1, sort_keys=True))
+	os.replace(temporary_path, path)
+
+
+def _is_up_to_date(manifest: dict[str, dict], output_dir: Path, module_name: str, hashes: dict) -> bool:
+	# Whether the files of a module were generated with the same hashes and still exist
+	entries = {file_name: entry for file_name, entry in manifest.items() if entry["module"] == module_name}
+	return bool(entries) and all(
+		entry == dict(module=module_name, **hashes) and (output_dir / file_name).is_file() for file_name, entry in entries.items()
+	)
+
+
+def _generate_plot(module_name: str, output_dir: Path) -> tuple[float, list[Path]]:
+	# Generate the plots of a module, returns the time it took and the files it wrote
+	start_time = time.perf_counter()
+	pop_written_paths()
+	importlib.import_module(module_name).generate_plot(_worker_data["data"], output_dir)
+	# The pool workers exit without running `atexit`, the cached similarities are written explicitly
+	get_similarity_cache().flush()
+	return time.perf_counter() - start_time, pop_written_paths()
+
+
+def generate_all_plots(n_workers: int | None = None, self_contained: bool = False, force: bool = False) -> None:
+	"""Generate all plots for the data story.
+
+	The modules whose source, declared inputs, data and the rest of the code (see `_code_hash`) did not change since they
+	last generated their plots (see `MANIFEST_FILENAME`) are skipped. The inputs declared by the other modules are computed first, then the modules
+	run in a pool of forked processes, which inherit the loaded data and inputs without copying them. The generation
+	stops at the first error: the modules that are not started yet are skipped, and the error is raised once the
+	modules that are already running are finished (their plots are kept).
+
+	Args:
+	    n_workers (int): the number of processes generating the plots, defaults to the number of CPUs. With 1 (or
+	              when processes cannot be forked), the plots are generated one after another in the current process.
+	              The inputs are computed with the same number of processes (see `set_n_workers`)
+	    self_contained (bool): whether each HTML file embeds plotly.js, instead of referencing the copy written once
+	                           next to the plots
+	    force (bool): whether to regenerate the plots of all the modules, even those that are up to date
+	"""
 	# Ensure output directory exists
 	output_dir = Path("data_story/assets/plots")
 	output_dir.mkdir(parents=True, exist_ok=True)
+	start_time = time.perf_counter()
 
-	data = load_graph_data()
+	set_self_contained(self_contained)
+	if not self_contained:
+		# Written before the processes are forked, which then all reference the same file
+		write_plotlyjs(output_dir)
 
-	logger.info("Generating plots...")
+	inputs = [name for plot_module in PLOT_MODULES for name in getattr(plot_module, "INPUTS", [])]
+	unknown = set(inputs) - set(DERIVED_INPUTS)
+	if unknown:
+		raise KeyError(f"Unknown plot inputs: {sorted(unknown)}")
 
+	manifest = _load_manifest(output_dir)
+	code_hash, data_hash = _code_hash(), _data_hash()
+	hashes = {
+		plot_module.__name__: _plot_hashes(plot_module, code_hash, data_hash, self_contained) for plot_module in PLOT_MODULES
+	}
 	plot_modules = [
-		communities_plot,
-		rank_vs_length_plot,
-		intro_plot,
-		semantic_plot,
-		regression_plot,
-		hubs_plot,
-		backtrack_plot,
-		link_strat_and_comparison,
-		hubs_impact,
-  		combinations
+		plot_module
+		for plot_module in PLOT_MODULES
+		if force or not _is_up_to_date(manifest, output_dir, plot_module.__name__, hashes[plot_module.__name__])
 	]
+	for plot_module in PLOT_MODULES:
+		if plot_module not in plot_modules:
+			logger.info(f"Skipping {plot_module.__name__}, its plots are up to date")
+	if not plot_modules:
+		logger.info("All plots are up to date!")
+		return
 
-	for plot_module in plot_modules:
-		try:
-			logger.info(f"Generating {plot_module.__name__}...")
-			plot_module.generate_plot(data, output_dir)
-		except Exception as e:
-			logger.error(f"Error generating {plot_module.__name__}: {str(e)}")
-			raise  # Re-raise to stop execution on error
+	_worker_data["data"] = load_graph_data()
+	# The inputs are computed before the plots, they can use all the processes
+	n_workers = n_workers or os.cpu_count() or 1
+	set_n_workers(n_workers)
+	_compute_inputs([name for plot_module in plot_modules for name in getattr(plot_module, "INPUTS", [])], set())
+
+	logger.info("Generating plots...")
 
-	logger.info("Plot generation complete!")
+	if n_workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+		for plot_module in plot_modules:
+			try:
+				logger.info(f"Generating {plot_module.__name__}...")
+				elapsed, paths = _generate_plot(plot_module.__name__, output_dir)
+				_record_outputs(manifest, output_dir, plot_module.__name__, hashes[plot_module.__name__], paths)
+				logger.info(f"Generated {plot_module.__name__} in {elapsed:.1f}s")
+			except Exception as e:
+				logger.error(f"Error generating {plot_module.__name__}: {str(e)}")
+				raise  # Re-raise to stop execution on error
+	else:
+		# The modules running in parallel do not start nested pools of processes
+		error = None
+		with ProcessPoolExecutor(
+			max_workers=n_workers, mp_context=multiprocessing.get_context("fork"), initializer=set_n_workers, initargs=(1,)
+		) as executor:
+			# A module is submitted when a process is free, so that no module is waiting in the queue of the pool
+			queued = iter(plot_modules)
+			futures = {}
+			for plot_module in itertools.islice(queued, n_workers):
+				futures[executor.submit(_generate_plot, plot_module.__name__, output_dir)] = plot_module
+			pending = set(futures)
+			while pending:
+				done, pending = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					plot_module = futures[future]
+					try:
+						elapsed, paths = future.result()
+						_record_outputs(manifest, output_dir, plot_module.__name__, hashes[plot_module.__name__], paths)
+						logger.info(f"Generated {plot_module.__name__} in {elapsed:.1f}s")
+					except Exception as e:
+						logger.error(f"Error generating {plot_module.__name__}: {str(e)}")
+						# Stop execution on error, the modules that are not started yet are not submitted
+						if error is None:
+							error = e
+					next_module = next(queued, None) if error is None else None
+					if next_module is not None:
+						next_future = executor.submit(_generate_plot, next_module.__name__, output_dir)
+						futures[next_future] = next_module
+						pending.add(next_future)
+
+		if error is not None:
+			raise error
+
+	logger.info(f"Plot generation complete in {time.perf_counter() - start_time:.1f}s!")
 
 
 if __name__ == "__main__":
-	generate_all_plots()
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--workers", type=int, default=None, help="number of processes generating the plots")
+	parser.add_argument(
+		"--self-contained", action="store_true", help="embed plotly.js in each HTML file instead of sharing one copy"
+	)
+	parser.add_argument("--force", action="store_true", help="regenerate all the plots, even those that are up to date")
+	args = parser.parse_args()
+
+	generate_all_plots(args.workers, args.self_contained, args.force)
@@ -0,0 +1,63 @@
+import os
+from functools import cache
+from pathlib import Path
+
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+
+# Name of the plotly.js bundle shared by the plots of a directory
+PLOTLYJS_FILENAME = "plotly.min.js"
+
+# Whether each HTML file embeds plotly.js (several MB) instead of referencing the copy shared by its directory
+_output_options = {"self_contained": False}
+
+# Paths of the files written by `write_figure` in this process, see `pop_written_paths`
+_written_paths: list[Path] = []
+
+
+def set_self_contained(self_contained: bool) -> None:
+	"""Choose whether the figures written by `write_figure` embed plotly.js or reference a shared copy."""
+	_output_options["self_contained"] = self_contained
+
+
+@cache
+def write_plotlyjs(output_dir: Path) -> None:
+	"""Write the plotly.js bundle referenced by the figures to `output_dir`, if it is missing or outdated.
+
+	The check is done once per directory and process, e.g. by `generate_all_plots` before the plots are generated.
+	"""
+	bundle = get_plotlyjs()
+	path = output_dir / PLOTLYJS_FILENAME
+	if path.is_file() and path.read_text(encoding="utf-8") == bundle:
+		return
+
+	# Write to a temporary file first, so that a concurrent reader never sees a partial file
+	temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+	temporary_path.write_text(bundle, encoding="utf-8")
+	os.replace(temporary_path, path)
+
+
+def pop_written_paths() -> list[Path]:
+	"""Return the paths of the files written by `write_figure` since the last call."""
+	paths = list(_written_paths)
+	_written_paths.clear()
+	return paths
+
+
+def write_figure(figure: go.Figure, path: Path) -> None:
+	"""Write a figure to an HTML file.
+
+	By default the file references the plotly.js bundle written once next to it (see `write_plotlyjs`), which makes
+	the files much smaller and lets the browser load the library once for all the plots of a page. With
+	`set_self_contained(True)`, the bundle is embedded in the file, which can then be opened on its own.
+
+	Args:
+		figure (go.Figure): the figure
+		path (Path): the path of the HTML file
+	"""
+	if _output_options["self_contained"]:
+		figure.write_html(path, include_plotlyjs=True, full_html=True)
+	else:
+		write_plotlyjs(path.parent)
+		figure.write_html(path, include_plotlyjs="directory", full_html=True)
+	_written_paths.append(path)
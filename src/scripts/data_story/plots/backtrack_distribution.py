@@ -2,6 +2,7 @@ import plotly.graph_objs as go
 import pandas as pd
 from pathlib import Path
 import numpy as np
+from src.scripts.data_story.plots import write_figure
 
 def compute_backtrack_statistics(data: dict) -> dict:
     """Compute comprehensive backtracking statistics."""
@@ -156,4 +157,4 @@ def generate_plot(data: dict, output_dir: Path) -> None:
     """Generate and save the plot."""
     fig = create_backtrack_analysis_plot(data)
     output_dir.mkdir(parents=True, exist_ok=True)
-    fig.write_html(output_dir / "backtrack_analysis.html", include_plotlyjs=True, full_html=True)
\ No newline at end of file
+    write_figure(fig, output_dir / "backtrack_analysis.html")
\ No newline at end of file
@@ -1,18 +1,31 @@
 import math
 import plotly.graph_objects as go
 
+from src.utils.strategies.comparison import bootstrap_selected_model, strategy_combination_contrasts
+from src.scripts.data_story.plots import write_figure
+
+# Scores used by each combination of strategies, a used strategy has a score one standard deviation above the mean
+COMBINATIONS = {
+    'Backtrack only': ['backtrack_ratio'],
+    'No strategies': [],
+    'All strategies': ['semantic_increase_score', 'top_links_ratio', 'hub_ratio', 'backtrack_ratio'],
+    'Semantic only': ['semantic_increase_score'],
+    'Semantic + Top Links': ['semantic_increase_score', 'top_links_ratio'],
+}
+
+INPUTS = ['selected_model_bootstrap']
+
+
 def generate_plot(data, output_dir):
-    strategies = ['Backtrack only', 'No strategies', 'All strategies', 'Semantic only', 'Semantic + Top Links']
-    durations = [193.5, 156.1, 156.0, 135.6, 127.4]
+    effects = bootstrap_selected_model(strategy_combination_contrasts(COMBINATIONS))
+
+    strategies = list(COMBINATIONS)
+    durations = effects['estimate'].tolist()
     colors = ['#9E9E9E', '#2196F3', '#2196F3', '#9E9E9E', '#4CAF50']
-    variances = [
-        (1.098)**2+(0.625)**2,
-        (1.098)**2,
-        (1.098)**2+(0.625)**2+(0.528)**2+(0.549)**2+(0.639)**2,
-        (1.098)**2+(0.528)**2,
-        (1.098)**2+(0.528)**2+(0.549)**2
-    ]
-    error_bars = [1.96 * math.sqrt(var) for var in variances]
+    # 95% bootstrap intervals over the targets
+    errors_plus = (effects['ci_high'] - effects['estimate']).tolist()
+    errors_minus = (effects['estimate'] - effects['ci_low']).tolist()
+    x_range = [10 * math.floor(effects['ci_low'].min() / 10 - 1), 10 * math.ceil(effects['ci_high'].max() / 10 + 1)]
 
     figure = go.Figure()
 
@@ -23,7 +36,9 @@ def generate_plot(data, output_dir):
             mode='markers',
             error_x=dict(
                 type='data',
-                array=[error_bars[i]],
+                symmetric=False,
+                array=[errors_plus[i]],
+                arrayminus=[errors_minus[i]],
                 visible=True,
                 color=colors[i],
                 thickness=1.5,
@@ -47,11 +62,9 @@ def generate_plot(data, output_dir):
         xaxis=dict(
             title='Duration',
             title_font=dict(size=16, color='rgb(44, 62, 80)'),
-            range=[110, 210],
+            range=x_range,
             ticksuffix='s',
-            tickmode='array',
-            tickvals=[120, 140, 160, 180, 200],
-            ticktext=['120s', '140s', '160s', '180s', '200s'],
+            dtick=20,
             gridcolor='white',
             showgrid=True,
             zeroline=False
@@ -73,4 +86,4 @@ def generate_plot(data, output_dir):
     figure.update_xaxes(showgrid=True, gridwidth=1, gridcolor='white')
     figure.update_yaxes(showgrid=True, gridwidth=1, gridcolor='white')
 
-    figure.write_html(output_dir / "strategies_combinations.html", include_plotlyjs=True, full_html=True)
\ No newline at end of file
+    write_figure(figure, output_dir / "strategies_combinations.html")
\ No newline at end of file
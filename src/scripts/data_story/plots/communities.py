@@ -1,5 +1,6 @@
 from pathlib import Path
 import plotly.graph_objects as go
+from src.scripts.data_story.plots import write_figure
 
 
 def generate_plot(data: dict, output_dir: Path) -> None:
@@ -31,4 +32,4 @@ def generate_plot(data: dict, output_dir: Path) -> None:
 		yaxis_title=None,
 	)
 
-	fig.write_html(output_dir / "communities_graph.html", include_plotlyjs=True, full_html=True)
+	write_figure(fig, output_dir / "communities_graph.html")
@@ -2,8 +2,9 @@ import plotly.graph_objs as go
 import networkx as nx
 from pathlib import Path
 import numpy as np
-from src.utils.strategies.hub_focused_strategy import compute_hub_usage_ratio
+from src.utils.strategies.hub_focused_strategy import hub_usage_ratio
 from src.utils.metrics import average_on_paths, pagerank
+from src.scripts.data_story.plots import write_figure
 import plotly.express as px
 import networkx as nx
 
@@ -12,14 +13,8 @@ def create_hub_usage_ratio_plot(data: dict) -> go.Figure:
     Create visualization of hub usage ratios in paths for finished and unfinished paths.
     """
     
-    def compute_ratios(paths):
-        return [
-            compute_hub_usage_ratio(path)
-            for path in paths["path"]
-        ]
-
-    finished_ratios = compute_ratios(data["paths_finished"])
-    unfinished_ratios = compute_ratios(data["paths_unfinished"])
+    finished_ratios = hub_usage_ratio(data["paths_finished_arrays"])
+    unfinished_ratios = hub_usage_ratio(data["paths_unfinished_arrays"])
 
     mean_finished = np.mean(finished_ratios)
     mean_unfinished = np.mean(unfinished_ratios)
@@ -162,7 +157,9 @@ def create_pagerank_distribution_plot(data: dict) -> go.Figure:
     return fig
 
 def generality_behavior(graph_data):
-	scores, percent = average_on_paths(10, graph_data["paths_finished"], pagerank(graph_data["graph"]))
+	scores, percent = average_on_paths(
+		10, graph_data["paths_finished"], pagerank(graph_data["graph"]), path_arrays=graph_data["paths_finished_arrays"]
+	)
 
 	plot = px.line(
 		x=percent,
@@ -181,10 +178,10 @@ def generate_plot(data: dict, output_dir: Path) -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
     
     plot_gen = generality_behavior(data)
-    plot_gen.write_html(output_dir / "plot_gen.html", include_plotlyjs=True, full_html=True)
+    write_figure(plot_gen, output_dir / "plot_gen.html")
 
     pagerank_fig = create_pagerank_distribution_plot(data)
-    pagerank_fig.write_html(output_dir / "pagerank_distribution.html", include_plotlyjs=True, full_html=True)
+    write_figure(pagerank_fig, output_dir / "pagerank_distribution.html")
 
     hub_usage_fig = create_hub_usage_ratio_plot(data)
-    hub_usage_fig.write_html(output_dir / "hub_usage_ratios.html", include_plotlyjs=True, full_html=True)
+    write_figure(hub_usage_fig, output_dir / "hub_usage_ratios.html")
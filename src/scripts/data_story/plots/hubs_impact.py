@@ -1,56 +1,67 @@
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
+from src.utils.strategies.comparison import bootstrap_selected_model
+from src.scripts.data_story.plots import write_figure
+
+INPUTS = ["selected_model_bootstrap"]
+
+
 def generate_plot(data, output_dir):
     effects = [
         {
             "name": "Hub (main effect)",
-            "effect": 2.414,
-            "se": 0.639,
+            "term": "hub_ratio",
             "category": "main",
             "description": "Direct impact of using Hub strategy"
         },
         {
             "name": "Hub × Semantic",
-            "effect": -2.337,
-            "se": 0.512,
+            "term": "semantic_increase_score:hub_ratio",
             "category": "interaction",
             "description": "Reduces duration when used with Semantic"
         },
         {
             "name": "Hub × Top Links",
-            "effect": -2.939,
-            "se": 0.493,
+            "term": "top_links_ratio:hub_ratio",
             "category": "interaction",
             "description": "Stronger reduction with Top Links"
         },
         {
             "name": "Hub × Backtrack",
-            "effect": -4.099,
-            "se": 0.651,
+            "term": "hub_ratio:backtrack_ratio",
             "category": "interaction",
             "description": "Strongest interaction, mitigates Backtrack"
         }
     ]
 
+    # Coefficients of the terms of the selected model, with 95% bootstrap intervals over the targets
+    terms = [effect["term"] for effect in effects]
+    estimates = bootstrap_selected_model(pd.DataFrame(np.eye(len(terms)), index=terms, columns=terms))
+
     names = [effect["name"] for effect in effects]
     y_pos = [i*1.5 for i in range(len(effects))]  # Increased spacing
-    effects_values = [effect["effect"] for effect in effects]
-    errors = [1.96 * effect["se"] for effect in effects]
+    effects_values = estimates["estimate"].tolist()
+    errors = ((estimates["ci_high"] - estimates["ci_low"]) / 2).tolist()
+    errors_plus = (estimates["ci_high"] - estimates["estimate"]).tolist()
+    errors_minus = (estimates["estimate"] - estimates["ci_low"]).tolist()
     categories = [effect["category"] for effect in effects]
     descriptions = [effect["description"] for effect in effects]
 
     fig = go.Figure()
 
     # Add error bars
-    for i, (effect, error, category, name) in enumerate(zip(effects_values, errors, categories, names)):
+    for i, (effect, category, name) in enumerate(zip(effects_values, categories, names)):
         color = '#3b82f6' if category == 'main' else '#22c55e'
         fig.add_trace(go.Scatter(
             x=[effect],
             y=[y_pos[i]],
             error_x=dict(
                 type='data',
-                symmetric=True,
-                array=[error],
+                symmetric=False,
+                array=[errors_plus[i]],
+                arrayminus=[errors_minus[i]],
                 color=color,
                 thickness=2,
                 width=10
@@ -161,4 +172,4 @@ def generate_plot(data, output_dir):
         yanchor="top"
     )
 
-    fig.write_html(output_dir / "hubs_impact.html", include_plotlyjs=True, full_html=True)
+    write_figure(fig, output_dir / "hubs_impact.html")
@@ -4,22 +4,25 @@ import plotly.express as px
 from src.utils.data import load_graph_data
 from src.utils.strategies.comparison import build_comparison_df
 from src.utils.strategies.link_strategy import get_click_positions
+from src.scripts.data_story.plots import write_figure
+
+INPUTS = ["article_vectors", "target_similarities", "link_positions"]
 
 
 def generate_plot(data, output_dir):
 	graph_data = load_graph_data()
 
 	pie_link = pie(graph_data)
-	pie_link.write_html(output_dir / "pie_top_clicks.html", include_plotlyjs=True, full_html=True)
+	write_figure(pie_link, output_dir / "pie_top_clicks.html")
 
 	finished, unfinished = build_comparison_df(graph_data)
 
 	link_barplot = times_comparison(finished)
-	link_barplot.write_html(output_dir / "link_barplot.html", include_plotlyjs=True, full_html=True)
+	write_figure(link_barplot, output_dir / "link_barplot.html")
 
 	barplot_success, barplot_times = comparison_performance(finished, unfinished)
-	barplot_success.write_html(output_dir / "barplot_success.html", include_plotlyjs=True, full_html=True)
-	barplot_times.write_html(output_dir / "barplot_times.html", include_plotlyjs=True, full_html=True)
+	write_figure(barplot_success, output_dir / "barplot_success.html")
+	write_figure(barplot_times, output_dir / "barplot_times.html")
 
 
 def pie(graph_data) -> px:
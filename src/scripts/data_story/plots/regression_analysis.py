@@ -1,18 +1,21 @@
 import pandas as pd
 import plotly.express as px
 
-from src.utils.strategies.comparison import perform_mixed_linear_regression
+from src.utils.strategies.comparison import get_mixed_linear_regression_fit
+from src.scripts.data_story.plots import write_figure
+
+INPUTS = ["mixed_model_fit"]
 
 
 def generate_plot(data, output_dir):
 	fig_fixed = plot_fixed_effects()
 	fig_random = plot_random_effects()
-	fig_fixed.write_html(output_dir / "fixed_effect.html", include_plotlyjs=True, full_html=True)
-	fig_random.write_html(output_dir / "random_effect.html", include_plotlyjs=True, full_html=True)
+	write_figure(fig_fixed, output_dir / "fixed_effect.html")
+	write_figure(fig_random, output_dir / "random_effect.html")
 
 
 def plot_fixed_effects():
-	result = perform_mixed_linear_regression()
+	result = get_mixed_linear_regression_fit()
 
 	# Extract fixed effects parameters excluding the Intercept
 	fe_params = result.fe_params.drop("Intercept")
@@ -27,7 +30,7 @@ def plot_fixed_effects():
 
 
 def plot_random_effects():
-	result = perform_mixed_linear_regression()
+	result = get_mixed_linear_regression_fit()
 	random_effects = result.random_effects
 
 	random_effects_df = pd.DataFrame.from_dict(random_effects, orient="index", columns=["Group"])
@@ -1,7 +1,8 @@
 from pathlib import Path
 import plotly.graph_objects as go
+from src.scripts.data_story.plots import write_figure
 
 def generate_plot(data, output_dir):
     from src.utils.analyzers.score_vs_length_analyzer import scores_vs_length_histograms
     fig = scores_vs_length_histograms(data)
-    fig.write_html(output_dir / "score_vs_length.html", include_plotlyjs=True, full_html=True)
\ No newline at end of file
+    write_figure(fig, output_dir / "score_vs_length.html")
\ No newline at end of file
@@ -3,13 +3,16 @@ import plotly.figure_factory as ff
 import plotly.graph_objs as go
 
 from src.utils.strategies.semantic_strategy import get_semantic_similarities, get_semantic_similarity
+from src.scripts.data_story.plots import write_figure
+
+INPUTS = ["article_vectors", "target_similarities"]
 
 
 def generate_plot(data, output_dir):
 	fig_path = semantic_path_example()
 	fig_matrix = similarity_matrix_figure()
-	fig_path.write_html(output_dir / "semantic_path_example.html", include_plotlyjs=True, full_html=True)
-	fig_matrix.write_html(output_dir / "similarity_matrix.html", include_plotlyjs=True, full_html=True)
+	write_figure(fig_path, output_dir / "semantic_path_example.html")
+	write_figure(fig_matrix, output_dir / "similarity_matrix.html")
 
 
 def semantic_path_example(path: list[str] = None):
@@ -36,6 +36,11 @@ def describe_value(value: Any) -> str:
 	if isinstance(value, tuple):
 		return f"Tuple ({len(value)})"
 
+	from src.utils.data.paths import PathArrays
+
+	if isinstance(value, PathArrays):
+		return f"PathArrays ({len(value)})"
+
 	raise ValueError(f"Cannot describe type {type(value)}")
 
 
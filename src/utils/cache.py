@@ -0,0 +1,229 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils import logger
+from src.utils.constants import ARTIFACTS_DATA_DIR
+
+# Rough memory used by one entry of the in-memory cache (ordered dict node, int key and float value)
+_ENTRY_SIZE_BYTES = 160
+
+
+class SimilarityCache:
+	"""Bounded LRU cache for symmetric similarities between integer ids.
+
+	The pairs (i, j) and (j, i) share the same entry. When the estimated memory of the cache exceeds
+	`max_bytes`, the least recently used entries are evicted. The cache keeps track of its hits, misses
+	and evictions (see `stats`).
+
+	If `spill_path` is given, computed values are also written to an SQLite database at that path, which
+	is looked up on in-memory misses. The database can be shared by several processes so that repeated
+	runs reuse prior work. Each process opens its own connection to the database, the values computed by a
+	process are written when `flush` is called (at the latest when the process exits normally).
+	"""
+
+	def __init__(self, max_bytes: int, spill_path: Path | None = None, flush_every: int = 10_000):
+		self.max_entries = max(1, max_bytes // _ENTRY_SIZE_BYTES)
+		self.spill_path = spill_path
+		self.flush_every = flush_every
+
+		self._entries: OrderedDict[int, float] = OrderedDict()
+		self._pending: dict[int, float] = {}
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.disk_hits = 0
+
+		self._connection = None
+		self._connection_pid = None
+		if spill_path is not None:
+			spill_path.parent.mkdir(parents=True, exist_ok=True)
+			atexit.register(self.flush)
+
+	@staticmethod
+	def key(i: int, j: int) -> int:
+		"""Return the key of the unordered pair {i, j}."""
+		i, j = int(i), int(j)
+		if i > j:
+			i, j = j, i
+		return (i << 32) | j
+
+	def _insert(self, key: int, value: float) -> None:
+		self._entries[key] = value
+		if len(self._entries) > self.max_entries:
+			self._entries.popitem(last=False)
+			self.evictions += 1
+
+	def _get_connection(self) -> sqlite3.Connection | None:
+		# SQLite connections must not be used across a fork, a forked process opens its own connection. The values
+		# pending in the parent are left to the parent to write
+		if self.spill_path is None:
+			return None
+		if self._connection_pid != os.getpid():
+			if self._connection_pid is not None:
+				self._pending.clear()
+			self._connection = sqlite3.connect(self.spill_path, timeout=60)
+			self._connection.execute("CREATE TABLE IF NOT EXISTS similarities (key INTEGER PRIMARY KEY, value REAL)")
+			self._connection_pid = os.getpid()
+		return self._connection
+
+	def _load_from_disk(self, connection: sqlite3.Connection, key: int) -> float | None:
+		if key in self._pending:
+			return self._pending[key]
+		row = connection.execute("SELECT value FROM similarities WHERE key = ?", (key,)).fetchone()
+		return None if row is None else row[0]
+
+	def get_or_compute(self, i: int, j: int, compute: Callable[[], float]) -> float:
+		"""Return the cached similarity between `i` and `j`, calling `compute()` on a miss."""
+		key = self.key(i, j)
+		if key in self._entries:
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return self._entries[key]
+
+		self.misses += 1
+		connection = self._get_connection()
+		value = self._load_from_disk(connection, key) if connection is not None else None
+		if value is not None:
+			self.disk_hits += 1
+		else:
+			value = compute()
+			if connection is not None:
+				self._pending[key] = float(value)
+				if len(self._pending) >= self.flush_every:
+					self.flush()
+
+		self._insert(key, value)
+		return value
+
+	def flush(self) -> None:
+		"""Write the values computed since the last flush to the spill database."""
+		connection = self._get_connection()
+		if connection is None or not self._pending:
+			return
+		with connection:
+			connection.executemany("INSERT OR IGNORE INTO similarities VALUES (?, ?)", self._pending.items())
+		self._pending.clear()
+
+	def clear(self) -> None:
+		"""Empty the in-memory cache and reset the counters, the spill database is kept."""
+		self.flush()
+		self._entries.clear()
+		self.hits = self.misses = self.evictions = self.disk_hits = 0
+
+	def stats(self) -> dict[str, int | float]:
+		"""Return the counters of the cache along with its current size."""
+		lookups = self.hits + self.misses
+		return dict(
+			hits=self.hits,
+			misses=self.misses,
+			disk_hits=self.disk_hits,
+			evictions=self.evictions,
+			hit_rate=self.hits / lookups if lookups else 0.0,
+			size=len(self._entries),
+			max_entries=self.max_entries,
+		)
+
+
+@contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+	"""Give a temporary path to write a file to, the file is moved to `path` once it is complete.
+
+	A concurrent reader never sees a partial file, and an interrupted write leaves nothing at `path`. The temporary
+	file is in the same directory as `path` and has the same suffix (so that e.g. `np.save` does not add one), it is
+	removed if the write fails.
+
+	Args:
+		path (Path): the final path of the file
+	"""
+	temporary_path = path.with_name(f".{path.stem}.{os.getpid()}.tmp{path.suffix}")
+	try:
+		yield temporary_path
+		os.replace(temporary_path, path)
+	finally:
+		temporary_path.unlink(missing_ok=True)
+
+
+def _hash_frame(data: pd.DataFrame | pd.Series) -> bytes:
+	# Content hash of a frame, list columns (e.g. paths) are joined so that they can be hashed by pandas
+	frame = data.to_frame() if isinstance(data, pd.Series) else data
+	columns = {}
+	for name, column in frame.items():
+		if column.dtype == object and column.map(lambda value: isinstance(value, list)).any():
+			column = column.map(lambda value: "\x1f".join(map(str, value)) if isinstance(value, list) else str(value))
+		columns[str(name)] = column
+	hashes = pd.util.hash_pandas_object(pd.DataFrame(columns, index=frame.index), index=True)
+	return repr(list(columns)).encode() + hashes.to_numpy().tobytes()
+
+
+def artifact_key(*parts) -> str:
+	"""Return a hash identifying the given inputs.
+
+	Data frames, series and arrays are hashed by content, the other parts (parameters, versions...) by their JSON
+	representation.
+	"""
+	key = hashlib.sha256()
+	for part in parts:
+		if isinstance(part, pd.DataFrame | pd.Series):
+			key.update(_hash_frame(part))
+		elif isinstance(part, np.ndarray):
+			key.update(repr((part.dtype, part.shape)).encode() + np.ascontiguousarray(part).tobytes())
+		else:
+			key.update(json.dumps(part, sort_keys=True, default=str).encode())
+		key.update(b"\x00")
+	return key.hexdigest()[:16]
+
+
+def cached_table(
+	name: str,
+	key: str,
+	compute: Callable[[], pd.DataFrame],
+	columns: list[str] | None = None,
+	directory: Path = ARTIFACTS_DATA_DIR,
+) -> pd.DataFrame:
+	"""Load a derived table from the artifact cache, computing and storing it first if it is not there.
+
+	The table is stored as `{directory}/{name}_{key}.parquet`, with its index and the types of its columns
+	(including list columns). Since `key` is a hash of everything the table depends on (see `artifact_key`), a
+	change of the inputs, of the parameters or of the version of the computation leads to a new file, and stale
+	tables are never read.
+
+	Args:
+		name (str): the name of the table
+		key (str): the key of the table, e.g. `artifact_key(data, params, version)`
+		compute (Callable[[], pd.DataFrame]): computes the table on a cache miss
+		columns (list[str]): if given, only these columns are read from the file
+		directory (Path): the directory of the cache
+
+	Returns:
+		pd.DataFrame: the table
+	"""
+	path = directory / f"{name}_{key}.parquet"
+	if not path.is_file():
+		logger.info(f"computing the {name} table...")
+		table = compute()
+
+		directory.mkdir(parents=True, exist_ok=True)
+		with atomic_path(path) as temporary_path:
+			table.to_parquet(temporary_path, engine="pyarrow")
+
+	# The table is always read back from the file, so that its types do not depend on whether it was cached
+	arrow_table = pq.read_table(path, columns=columns, use_pandas_metadata=True)
+	table = arrow_table.to_pandas()
+	for field in arrow_table.schema:
+		# Lists are read as arrays by default
+		if pa.types.is_list(field.type) and field.name in table.columns:
+			table[field.name] = arrow_table.column(field.name).to_pylist()
+
+	return table
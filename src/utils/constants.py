@@ -8,6 +8,23 @@ PATHS_AND_GRAPH_FOLDER = DATA_DIR / "wikispeedia_paths-and-graph"
 WP_SOURCE_DATA_FOLDER = DATA_DIR / "wpcd/wp"
 PLAINTEXT_DIR = DATA_DIR / "plaintext_articles"
 
+# Related to generated data
+
+GENERATED_DATA_DIR = DATA_DIR / "generated"
+SEMANTIC_DATA_DIR = GENERATED_DATA_DIR / "semantic"
+CORPUS_DATA_DIR = GENERATED_DATA_DIR / "corpus"
+ARTIFACTS_DATA_DIR = GENERATED_DATA_DIR / "artifacts"
+
+# Related to the semantic strategy
+
+# Either "tfidf" (sparse TF-IDF vectors) or "lsa" (dense TruncatedSVD embeddings of the TF-IDF matrix)
+SEMANTIC_BACKEND = "tfidf"
+LSA_N_COMPONENTS = 256
+
+# Memory cap of the pairwise similarity cache, and whether computed similarities are also stored on disk
+SIMILARITY_CACHE_MAX_BYTES = 256 * 2**20
+SIMILARITY_CACHE_SPILL_TO_DISK = False
+
 # Related to configuration for LLMs
 
 HF_KEY = None
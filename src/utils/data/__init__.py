@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import hashlib
+import itertools
 import os
 from datetime import datetime
 from functools import cache
@@ -17,6 +19,7 @@ from src.utils import logger
 from src.utils.constants import PATHS_AND_GRAPH_FOLDER, WP_SOURCE_DATA_FOLDER
 
 from .graph import extract_players_graph
+from .paths import PathArrays
 
 
 def load_data_from_file(file_path: str) -> pd.DataFrame:
@@ -113,6 +116,33 @@ def _index_based_to_df_matrix(
 	return matrix
 
 
+@cache
+def dataset_fingerprint() -> str:
+	"""Return a hash of the content of the data files read by `load_graph_data`, which changes iff the dataset does.
+
+	Raises:
+			ValueError: if the data is not configured correctly
+
+	Returns:
+			str: the fingerprint of the dataset
+
+	"""
+	if not Path.is_dir(PATHS_AND_GRAPH_FOLDER):
+		raise ValueError(
+			"The data is not setup correctly, please follow the instructions in `data/README.md`.",
+		)
+
+	fingerprint = hashlib.sha256()
+	for path in sorted(PATHS_AND_GRAPH_FOLDER.iterdir()):
+		if path.suffix in (".tsv", ".txt") and path.is_file():
+			fingerprint.update(path.name.encode() + b"\x00")
+			with open(path, "rb") as file:
+				while chunk := file.read(1 << 20):
+					fingerprint.update(chunk)
+			fingerprint.update(b"\x00")
+	return fingerprint.hexdigest()[:16]
+
+
 @cache
 def load_graph_data(top_n=200) -> dict[str, nx.DiGraph | pd.DataFrame | npt.NDArray]:
 	"""Load the original dataset with some preprocessing.
@@ -177,6 +207,10 @@ def load_graph_data(top_n=200) -> dict[str, nx.DiGraph | pd.DataFrame | npt.NDAr
 	)
 	graph_data["paths_unfinished"]["target"] = graph_data["paths_unfinished"]["target"].apply(unquote)
 
+	logger.info("resolving backtracks in paths...")
+	for k in ["paths_finished", "paths_unfinished"]:
+		graph_data[f"{k}_arrays"] = PathArrays.from_paths(graph_data[k]["path"], graph_data["articles"]["name"])
+
 	logger.info("formatting distance matrix...")
 	index_based_matrix = np.array(
 		[
@@ -209,6 +243,7 @@ def load_graph_data(top_n=200) -> dict[str, nx.DiGraph | pd.DataFrame | npt.NDAr
 	graph_data["graph"] = extract_players_graph(
 		graph_data,
 		paths=pd.concat([graph_data["paths_finished"], graph_data["paths_unfinished"]]),
+		path_arrays=PathArrays.concat([graph_data["paths_finished_arrays"], graph_data["paths_unfinished_arrays"]]),
 	)
 
 	# The following piece of code is used to create our success metric for the path strategies
@@ -260,12 +295,16 @@ def clean_path(input: list[str] | pd.Series) -> list[str] | pd.Series:
 				new_path.append(article)
 		return new_path
 
-def explode_paths(paths: pd.DataFrame, threshold: int = 500, clear_backticks: bool = False) -> pd.DataFrame:
+def explode_paths(
+	paths: pd.DataFrame, threshold: int = 500, clear_backticks: bool = False, path_arrays: PathArrays | None = None
+) -> pd.DataFrame:
 	"""Explode each path by creating one row for each article visited in the path.
 
 	Args:
 			paths: pd.DataFrame, either paths_finished or paths_unfinished as returned by `load_graph_data`.
 			threshold:	int, paths above this threshold are ignored
+			clear_backticks: bool, whether backtracked articles are removed from the paths (see `clean_path`)
+			path_arrays: PathArrays, the precomputed arrays of `paths` (e.g. `paths_finished_arrays`), computed if None
 
 	Returns:
 			exploded_paths:			pd.DataFrame, one row for each article visited in each path.
@@ -274,25 +313,30 @@ def explode_paths(paths: pd.DataFrame, threshold: int = 500, clear_backticks: bo
 			The column `path_length` holds the distance between the new `source` and the end of the path.
 
 	"""
-	exploded_paths = paths[lambda x: x["path_length"] <= threshold].copy(deep=True)
+	selected = (paths["path_length"] <= threshold).to_numpy()
+	paths = paths[selected]
 
 	# Clean backticks from the path if necessary:
+	path_column = paths["path"]
 	if clear_backticks:
-		exploded_paths = exploded_paths.transform(
-			axis='columns',
-			func=clean_path
-		)
-
-	# Explode the paths
-	exploded_paths["source"] = exploded_paths["path"].map(
-		lambda p: [dict(rank=i, name=node) for i, node in enumerate(p)],
-	)
-	exploded_paths = exploded_paths.explode("source")
-
-	# Restructure columns
-	exploded_paths["rank"] = exploded_paths["source"].apply(lambda src: src["rank"])
-	exploded_paths["source"] = exploded_paths["source"].apply(lambda src: src["name"])
-	exploded_paths["path_length"] = exploded_paths["path_length"] - exploded_paths["rank"]
+		if path_arrays is None:
+			path_arrays = PathArrays.from_paths(path_column)
+		else:
+			path_arrays = path_arrays.take(np.flatnonzero(selected))
+		path_column = pd.Series(path_arrays.to_lists("popped"), index=paths.index, dtype=object)
+	lengths = path_column.map(len).to_numpy(dtype=np.int64)
+	path_lengths = lengths if clear_backticks else paths["path_length"].to_numpy()
+
+	# Explode the paths: each row is repeated once per article, and the rank is the position in the path
+	row_positions = np.repeat(np.arange(len(paths)), lengths)
+	offsets = np.cumsum(lengths) - lengths
+	rank = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+
+	exploded_paths = paths.iloc[row_positions].copy()
+	exploded_paths["path"] = path_column.to_numpy()[row_positions]
+	exploded_paths["source"] = np.fromiter(itertools.chain.from_iterable(path_column), dtype=object, count=len(rank))
+	exploded_paths["rank"] = rank
+	exploded_paths["path_length"] = path_lengths[row_positions] - rank
 
 	# Remove paths to self
 	exploded_paths = exploded_paths[lambda x: x["source"] != x["target"]]
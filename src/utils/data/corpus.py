@@ -0,0 +1,94 @@
+import hashlib
+import json
+from functools import cache
+from urllib.parse import quote, unquote
+
+import numpy as np
+import numpy.typing as npt
+
+from src.utils import logger
+from src.utils.cache import atomic_path
+from src.utils.constants import CORPUS_DATA_DIR, PATHS_AND_GRAPH_FOLDER, PLAINTEXT_DIR
+from src.utils.data import load_data_from_file
+
+CORPUS_FILE = CORPUS_DATA_DIR / "corpus.bin"
+OFFSETS_FILE = CORPUS_DATA_DIR / "corpus_offsets.npy"
+MANIFEST_FILE = CORPUS_DATA_DIR / "corpus.json"
+
+
+class PackedCorpus:
+	"""Read-only view over the plaintext articles packed by `pack_corpus`.
+
+	The text of article `i` is stored as UTF-8 in `data[offsets[i]:offsets[i + 1]]`, the whole file is
+	memory-mapped so that only the articles that are actually read are loaded in memory.
+	"""
+
+	def __init__(self, data: np.memmap, offsets: npt.NDArray[np.int64], articles: list[str], corpus_hash: str):
+		self.data = data
+		self.offsets = offsets
+		self.articles = articles
+		self.corpus_hash = corpus_hash
+
+	def __len__(self) -> int:
+		return len(self.articles)
+
+	def __getitem__(self, i: int) -> str:
+		return self.data[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+
+	def texts(self):
+		"""Iterate over the text of all the articles, in order."""
+		for i in range(len(self)):
+			yield self[i]
+
+
+def _load_article_names() -> list[str]:
+	# Only the articles file is needed here, there is no need to go through `load_graph_data`
+	articles = load_data_from_file(PATHS_AND_GRAPH_FOLDER / "articles.tsv")
+	return articles["article"].apply(unquote).tolist()
+
+
+def pack_corpus() -> None:
+	"""Pack all the plaintext articles into a single file with an offsets index.
+
+	The articles are stored in the order of `articles.tsv`, which is also the order used by the TF-IDF
+	matrix. A manifest with the article names and the SHA-256 of the packed corpus is written next to it.
+	"""
+	articles = _load_article_names()
+	CORPUS_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+	logger.info(f"packing {len(articles)} plaintext articles...")
+	offsets = np.zeros(len(articles) + 1, dtype=np.int64)
+	corpus_hash = hashlib.sha256()
+	with atomic_path(CORPUS_FILE) as temporary_path, open(temporary_path, "wb") as corpus_file:
+		for i, article in enumerate(articles):
+			with open(f"{PLAINTEXT_DIR}/{quote(article)}.txt", encoding="utf-8") as f:
+				text = f.read().encode("utf-8")
+			corpus_file.write(text)
+			corpus_hash.update(text)
+			offsets[i + 1] = offsets[i] + len(text)
+
+	with atomic_path(OFFSETS_FILE) as temporary_path:
+		np.save(temporary_path, offsets)
+	# The manifest is written last, the corpus is only loaded when it exists
+	with atomic_path(MANIFEST_FILE) as temporary_path, open(temporary_path, "w", encoding="utf-8") as f:
+		json.dump({"articles": articles, "sha256": corpus_hash.hexdigest()}, f)
+
+
+@cache
+def load_corpus() -> PackedCorpus:
+	"""Memory-map the packed plaintext corpus, packing it first if needed.
+
+	Returns:
+		PackedCorpus: the packed corpus
+	"""
+	if not (CORPUS_FILE.is_file() and OFFSETS_FILE.is_file() and MANIFEST_FILE.is_file()):
+		pack_corpus()
+
+	with open(MANIFEST_FILE, encoding="utf-8") as f:
+		manifest = json.load(f)
+
+	offsets = np.load(OFFSETS_FILE)
+	# np.memmap does not support empty files
+	data = np.memmap(CORPUS_FILE, dtype=np.uint8, mode="r") if offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+
+	return PackedCorpus(data, offsets, manifest["articles"], manifest["sha256"])
@@ -1,8 +1,11 @@
 from typing import Any
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+from .paths import PathArrays
+
 Node = str
 Edge = tuple[str, str]
 
@@ -10,6 +13,7 @@ Edge = tuple[str, str]
 def _get_edge_weights(
 	graph_data: dict[str, Any],
 	paths: pd.DataFrame,
+	path_arrays: PathArrays | None = None,
 ) -> tuple[dict[Edge, int], set[Edge]]:
 	"""Return a dictionary where the keys are tuples representing an edge (u, v) and values are the edges weights.
 
@@ -17,6 +21,8 @@ def _get_edge_weights(
 	If a user clicked on '<', the article that was discarded does not contribute to the weight.
 
 	Also returns the set of edges that are present in 'paths_(un)finished.tsv' but not in 'links.tsv'
+
+	The backtracks are resolved with `path_arrays` (the "popped" variant), which are computed from `paths` if not given.
 	"""
 	# Initialize all edge weights to zero
 	edge_weights = {
@@ -27,24 +33,27 @@ def _get_edge_weights(
 		)
 	}
 
+	if path_arrays is None:
+		path_arrays = PathArrays.from_paths(paths["path"], graph_data["articles"]["name"])
+
+	# Count the transitions between consecutive articles of the paths without '<'
+	indptr, article_ids = path_arrays.variant("popped")
+	segments = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+	same_path = segments[1:] == segments[:-1]
+	n_articles = len(path_arrays.articles)
+	edge_codes = article_ids[:-1][same_path] * n_articles + article_ids[1:][same_path]
+	edge_codes, counts = np.unique(edge_codes, return_counts=True)
+	sources, targets = np.divmod(edge_codes, n_articles)
+
 	# Increase edge weights
 	unrecognized_edges: set[tuple[str, str]] = set()
-	for _, row in paths.iterrows():
-		path = row["path"]
-		clean_path = []  # Path without '<'
-		for element in path:
-			if element == "<":
-				clean_path.pop()
-			else:
-				clean_path.append(element)
-
-		for i in range(1, len(clean_path)):
-			edge = (clean_path[i - 1], clean_path[i])
-			if edge not in edge_weights:
-				unrecognized_edges.add(edge)
-				edge_weights[edge] = 0
-
-			edge_weights[edge] += 1
+	for source, target, count in zip(path_arrays.articles[sources], path_arrays.articles[targets], counts.tolist()):
+		edge = (source, target)
+		if edge not in edge_weights:
+			unrecognized_edges.add(edge)
+			edge_weights[edge] = 0
+
+		edge_weights[edge] += count
 
 	assert sum(edge_weights.values()) == sum(paths["path"].apply(len)) - 2 * sum(
 		paths["path"].apply(lambda list: list.count("<")),
@@ -53,7 +62,7 @@ def _get_edge_weights(
 	return edge_weights, unrecognized_edges
 
 
-def extract_players_graph(graph_data: dict, paths: pd.DataFrame) -> nx.DiGraph:
+def extract_players_graph(graph_data: dict, paths: pd.DataFrame, path_arrays: PathArrays | None = None) -> nx.DiGraph:
 	"""Generate a directed graph from the provided graph_data.
 
 	- Nodes: Each node in the graph represents an article.
@@ -64,6 +73,7 @@ def extract_players_graph(graph_data: dict, paths: pd.DataFrame) -> nx.DiGraph:
 	----------
 	- graph_data: The graph data
 	- finished_paths: Whether to use 'paths_finished' or 'paths_unfinished'
+	- path_arrays: The precomputed `PathArrays` of the paths, computed if None
 
 	Returns
 	-------
@@ -76,7 +86,7 @@ def extract_players_graph(graph_data: dict, paths: pd.DataFrame) -> nx.DiGraph:
 	graph.add_nodes_from(graph_data["articles"]["name"])
 
 	# Add edges to graph
-	edge_weights, unrecognized_edges = _get_edge_weights(graph_data, paths)
+	edge_weights, unrecognized_edges = _get_edge_weights(graph_data, paths, path_arrays)
 	for (source, dest), count in edge_weights.items():
 		graph.add_edge(source, dest, weight=count)
 
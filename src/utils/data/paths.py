@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import itertools
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+# Id used for the '<' (backtrack) steps in the raw variant of `PathArrays`
+BACKTRACK = -1
+
+PATH_VARIANTS = ("raw", "popped", "dropped")
+
+
+def paths_to_csr(
+	paths: Iterable[list[str]],
+	article_to_index: dict[str, int],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+	"""Encode a collection of paths as a CSR-like pair of arrays.
+
+	The articles of path `i` are `article_ids[indptr[i]:indptr[i + 1]]`.
+
+	Args:
+		paths (Iterable[list[str]]): the paths to encode, as lists of article names
+		article_to_index (dict): a mapping from article names to their integer id
+
+	Raises:
+		KeyError: if an article of a path is not in `article_to_index`
+
+	Returns:
+		indptr (np.ndarray): offsets of each path in `article_ids`, of length `len(paths) + 1`
+		article_ids (np.ndarray): the concatenated article ids of all the paths
+
+	"""
+	lengths = []
+	article_ids = []
+	for path in paths:
+		lengths.append(len(path))
+		article_ids.extend(article_to_index[article] for article in path)
+
+	indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+	np.cumsum(lengths, out=indptr[1:])
+
+	return indptr, np.asarray(article_ids, dtype=np.int64)
+
+
+def _lengths_to_indptr(lengths: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+	indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+	np.cumsum(lengths, out=indptr[1:])
+	return indptr
+
+
+def _segment_ids(indptr: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+	return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def filter_csr(
+	indptr: npt.NDArray[np.int64], values: npt.NDArray, keep: npt.NDArray[np.bool_]
+) -> tuple[npt.NDArray[np.int64], npt.NDArray]:
+	"""Keep the values of a CSR array where `keep` is True, returning the new `(indptr, values)`."""
+	lengths = np.bincount(_segment_ids(indptr)[keep], minlength=len(indptr) - 1)
+	return _lengths_to_indptr(lengths), values[keep]
+
+
+def _take_csr(
+	indptr: npt.NDArray[np.int64], values: npt.NDArray, positions: npt.NDArray[np.int64]
+) -> tuple[npt.NDArray[np.int64], npt.NDArray]:
+	# Select (and possibly reorder or repeat) segments of a CSR array
+	lengths = np.diff(indptr)[positions]
+	new_indptr = _lengths_to_indptr(lengths)
+	source = np.arange(new_indptr[-1]) + np.repeat(indptr[positions] - new_indptr[:-1], lengths)
+	return new_indptr, values[source]
+
+
+class PathArrays:
+	"""CSR representation of a set of paths, with the backtracks ('<') resolved once for all consumers.
+
+	Articles are encoded by their position in `articles`, which for the data returned by `load_graph_data`
+	is the order of `articles.tsv` (also used by the shortest path matrix and the TF-IDF matrix).
+	Three variants of the paths are available, see `variant`:
+
+	- "raw": the original paths, '<' steps are encoded as `BACKTRACK`
+	- "popped": each '<' removes the previous article, as if the player never visited it (see `clean_path`)
+	- "dropped": the '<' steps are removed but the articles that were backtracked are kept
+
+	The positions of the '<' steps in the raw paths are stored in `backtrack_indptr`/`backtrack_positions`.
+	"""
+
+	def __init__(
+		self,
+		index: pd.Index,
+		articles: npt.NDArray,
+		variants: dict[str, tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]],
+		backtrack_indptr: npt.NDArray[np.int64],
+		backtrack_positions: npt.NDArray[np.int64],
+	):
+		self.index = index
+		self.articles = articles
+		self.variants = variants
+		self.backtrack_indptr = backtrack_indptr
+		self.backtrack_positions = backtrack_positions
+
+	@classmethod
+	def from_paths(cls, paths: pd.Series | Sequence[list[str]], articles: Sequence[str] | None = None) -> PathArrays:
+		"""Encode paths and resolve their backtracks, in a vectorized way.
+
+		Args:
+			paths (pd.Series | Sequence[list[str]]): the paths, as lists of article names possibly containing '<'
+			articles (Sequence[str]): the article names defining the ids. If None, the distinct articles of the
+			                          paths are used, in order of appearance
+
+		Raises:
+			KeyError: if a path contains an article that is not in `articles`
+			ValueError: if a path contains a '<' that does not match any previous article
+
+		Returns:
+			PathArrays: the encoded paths
+		"""
+		index = paths.index if isinstance(paths, pd.Series) else pd.RangeIndex(len(paths))
+		lengths = np.fromiter(map(len, paths), dtype=np.int64, count=len(paths))
+		tokens = np.fromiter(itertools.chain.from_iterable(paths), dtype=object, count=lengths.sum())
+		is_backtrack = tokens == "<"
+
+		if articles is None:
+			articles = pd.unique(tokens[~is_backtrack])
+		articles = np.asarray(articles, dtype=object)
+
+		ids = pd.Index(articles).get_indexer(tokens).astype(np.int64)
+		unknown = (ids < 0) & ~is_backtrack
+		if unknown.any():
+			raise KeyError(f"Unknown articles in paths: {sorted(set(tokens[unknown]))[:10]}")
+		ids[is_backtrack] = BACKTRACK
+
+		raw_indptr = _lengths_to_indptr(lengths)
+		segments = _segment_ids(raw_indptr)
+
+		# Depth of the navigation stack after each step, relative to the start of the path
+		steps = np.where(is_backtrack, -1, 1)
+		cumulated = np.cumsum(steps)
+		depth = cumulated - np.append(0, cumulated)[raw_indptr[:-1]][segments]
+		if (depth < 0).any():
+			raise ValueError("Attempted to clean a path that had an unmatched backtick.")
+
+		# An article is popped iff the depth later falls below its own depth in the same path.
+		# The suffix minimum is computed on the whole array at once, segments are offset so that
+		# the running minimum restarts at the end of each path when scanning backwards.
+		offset_depth = depth + segments * (2 * lengths.max(initial=0) + 2)
+		suffix_min = np.minimum.accumulate(offset_depth[::-1])[::-1]
+		next_suffix_min = np.full(len(ids), np.iinfo(np.int64).max)
+		same_path = segments[1:] == segments[:-1]
+		next_suffix_min[:-1][same_path] = suffix_min[1:][same_path]
+		kept = ~is_backtrack & (offset_depth <= next_suffix_min)
+
+		variants = {
+			"raw": (raw_indptr, ids),
+			"popped": filter_csr(raw_indptr, ids, kept),
+			"dropped": filter_csr(raw_indptr, ids, ~is_backtrack),
+		}
+		backtrack_indptr, backtrack_positions = filter_csr(raw_indptr, np.arange(len(ids)) - raw_indptr[segments], is_backtrack)
+
+		return cls(index, articles, variants, backtrack_indptr, backtrack_positions)
+
+	@staticmethod
+	def concat(path_arrays: Sequence[PathArrays]) -> PathArrays:
+		"""Concatenate several `PathArrays` sharing the same articles."""
+		articles = path_arrays[0].articles
+
+		def concat_csr(parts):
+			indptrs, values = zip(*parts)
+			lengths = np.concatenate([np.diff(indptr) for indptr in indptrs])
+			return _lengths_to_indptr(lengths), np.concatenate(values)
+
+		variants = {name: concat_csr([arrays.variants[name] for arrays in path_arrays]) for name in PATH_VARIANTS}
+		backtrack_indptr, backtrack_positions = concat_csr(
+			[(arrays.backtrack_indptr, arrays.backtrack_positions) for arrays in path_arrays]
+		)
+		index = path_arrays[0].index.append([arrays.index for arrays in path_arrays[1:]])
+
+		return PathArrays(index, articles, variants, backtrack_indptr, backtrack_positions)
+
+	def __len__(self) -> int:
+		return len(self.index)
+
+	def variant(self, name: str = "popped") -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+		"""Return the `(indptr, article_ids)` CSR arrays of a variant ("raw", "popped" or "dropped")."""
+		return self.variants[name]
+
+	def lengths(self, name: str = "raw") -> npt.NDArray[np.int64]:
+		"""Return the length of each path in the given variant."""
+		return np.diff(self.variants[name][0])
+
+	@property
+	def backtrack_counts(self) -> npt.NDArray[np.int64]:
+		"""Return the number of '<' steps of each path."""
+		return np.diff(self.backtrack_indptr)
+
+	def take(self, positions: npt.ArrayLike) -> PathArrays:
+		"""Select paths by their integer position."""
+		positions = np.asarray(positions, dtype=np.int64)
+		variants = {name: _take_csr(*self.variants[name], positions) for name in PATH_VARIANTS}
+		backtrack_indptr, backtrack_positions = _take_csr(self.backtrack_indptr, self.backtrack_positions, positions)
+		return PathArrays(self.index[positions], self.articles, variants, backtrack_indptr, backtrack_positions)
+
+	def loc(self, labels: pd.Index | Sequence) -> PathArrays:
+		"""Select paths by their index label, e.g. `path_arrays.loc(paths.index)` for a subset `paths` of the data."""
+		positions = self.index.get_indexer(labels)
+		if (positions < 0).any():
+			raise KeyError("Some labels are not in the index of the paths.")
+		return self.take(positions)
+
+	def without_backtracks(self, name: str = "dropped") -> PathArrays:
+		"""Return the paths of the given variant as new paths without any '<', e.g. to score the "dropped" variant."""
+		indptr, ids = self.variants[name]
+		variants = {variant: (indptr, ids) for variant in PATH_VARIANTS}
+		backtrack_indptr = np.zeros(len(indptr), dtype=np.int64)
+		return PathArrays(self.index, self.articles, variants, backtrack_indptr, np.zeros(0, dtype=np.int64))
+
+	def article_ids(self, names: Sequence[str]) -> npt.NDArray[np.int64]:
+		"""Return the ids of the given article names, -1 for unknown names."""
+		return pd.Index(self.articles).get_indexer(names).astype(np.int64)
+
+	def to_lists(self, name: str = "popped") -> list[list[str]]:
+		"""Decode a variant back to lists of article names."""
+		indptr, ids = self.variants[name]
+		names = np.append(self.articles, "<")[ids]
+		return [names[start:end].tolist() for start, end in zip(indptr[:-1], indptr[1:])]
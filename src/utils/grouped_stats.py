@@ -0,0 +1,417 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from scipy.stats import t as student_t
+
+
+def segment_ids(indptr: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+	"""Return the segment of each element of a flat array split by `indptr`.
+
+	Args:
+		indptr (np.ndarray): offsets of each segment, of length `n_segments + 1`
+
+	Returns:
+		np.ndarray: an array of length `indptr[-1]` with the segment index of each element
+	"""
+	return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def segment_sum(indptr: npt.NDArray[np.int64], values: npt.NDArray) -> npt.NDArray[np.float64]:
+	"""Sum the values of each segment, empty segments sum to 0."""
+	return np.bincount(segment_ids(indptr), weights=values, minlength=len(indptr) - 1)
+
+
+def grouped_rank(indptr: npt.NDArray[np.int64], values: npt.NDArray) -> npt.NDArray[np.float64]:
+	"""Rank the values within each segment, ties get the average of their ranks (like `scipy.stats.rankdata`).
+
+	Ranks start at 1 in each segment. NaN values get a NaN rank and do not affect the rank of the other values.
+
+	Args:
+		indptr (np.ndarray): offsets of each segment in `values`
+		values (np.ndarray): the flat values to rank
+
+	Returns:
+		np.ndarray: the rank of each value within its segment
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	segments = segment_ids(indptr)
+
+	# NaN are sorted last in each segment by lexsort
+	order = np.lexsort((values, segments))
+	sorted_values = values[order]
+	sorted_segments = segments[order]
+	positions = np.arange(len(values)) - indptr[sorted_segments]
+
+	# A run of ties starts at every change of segment or of value
+	run_starts = np.ones(len(values), dtype=bool)
+	run_starts[1:] = (sorted_segments[1:] != sorted_segments[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+	run_ids = np.cumsum(run_starts) - 1
+	run_first_index = np.flatnonzero(run_starts)
+	run_last_index = np.append(run_first_index[1:], len(values)) - 1
+
+	# Every tie gets the average of the (1-based) positions of its run in the segment
+	average_ranks = (positions[run_first_index] + positions[run_last_index]) / 2 + 1
+
+	ranks = np.empty(len(values), dtype=np.float64)
+	ranks[order] = average_ranks[run_ids]
+	ranks[np.isnan(values)] = np.nan
+
+	return ranks
+
+
+def spearman_with_index(indptr: npt.NDArray[np.int64], values: npt.NDArray) -> npt.NDArray[np.float64]:
+	"""Compute, for each segment, the Spearman correlation between the values and their position 0..n-1.
+
+	This is equivalent to calling `scipy.stats.spearmanr(range(n), segment)` on every segment. The result is
+	NaN for segments with less than two values, constant values or NaN values.
+
+	Args:
+		indptr (np.ndarray): offsets of each segment in `values`
+		values (np.ndarray): the flat values
+
+	Returns:
+		np.ndarray: the Spearman correlation of each segment
+	"""
+	lengths = np.diff(indptr).astype(np.float64)
+	segments = segment_ids(indptr)
+	n_segments = len(lengths)
+
+	ranks = grouped_rank(indptr, values)
+	positions = np.arange(len(ranks)) - indptr[segments]
+
+	# Average ranks always have a mean of (n + 1) / 2, the positions have a mean of (n - 1) / 2
+	centered_ranks = ranks - (lengths[segments] + 1) / 2
+	centered_positions = positions - (lengths[segments] - 1) / 2
+
+	covariance = np.bincount(segments, weights=centered_ranks * centered_positions, minlength=n_segments)
+	rank_variance = np.bincount(segments, weights=centered_ranks**2, minlength=n_segments)
+	position_variance = lengths * (lengths**2 - 1) / 12
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		correlation = covariance / np.sqrt(rank_variance * position_variance)
+
+	correlation[(lengths < 2) | (rank_variance <= 0)] = np.nan
+	return np.clip(correlation, -1, 1)
+
+
+def grouped_pearson(
+	indptr: npt.NDArray[np.int64], x: npt.NDArray, y: npt.NDArray
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+	"""Compute, for each segment, the Pearson correlation and the covariance between `x` and `y`.
+
+	This is equivalent to calling `np.corrcoef` and `np.cov` (with `ddof=1`) on every segment. Both results are
+	NaN for segments with less than two values, the correlation is also NaN when `x` or `y` is constant.
+
+	Args:
+		indptr (np.ndarray): offsets of each segment in `x` and `y`
+		x (np.ndarray): the flat values of the first variable
+		y (np.ndarray): the flat values of the second variable
+
+	Returns:
+		correlation (np.ndarray): the Pearson correlation of each segment
+		covariance (np.ndarray): the sample covariance of each segment
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	lengths = np.diff(indptr).astype(np.float64)
+	segments = segment_ids(indptr)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		centered_x = x - (segment_sum(indptr, x) / lengths)[segments]
+		centered_y = y - (segment_sum(indptr, y) / lengths)[segments]
+
+		covariance = segment_sum(indptr, centered_x * centered_y) / (lengths - 1)
+		variance_x = segment_sum(indptr, centered_x**2) / (lengths - 1)
+		variance_y = segment_sum(indptr, centered_y**2) / (lengths - 1)
+		correlation = np.clip(covariance / np.sqrt(variance_x) / np.sqrt(variance_y), -1, 1)
+
+	covariance[lengths < 2] = np.nan
+	correlation[(lengths < 2) | (variance_x <= 0) | (variance_y <= 0)] = np.nan
+
+	return correlation, covariance
+
+
+def grouped_spearman(indptr: npt.NDArray[np.int64], x: npt.NDArray, y: npt.NDArray) -> npt.NDArray[np.float64]:
+	"""Compute, for each segment, the Spearman correlation between `x` and `y` (the Pearson correlation of their ranks).
+
+	The result is NaN for segments with less than two values, constant values or NaN values, like `scipy.stats.spearmanr`.
+	"""
+	x_ranks = grouped_rank(indptr, x)
+	y_ranks = grouped_rank(indptr, y)
+	correlation, _ = grouped_pearson(indptr, x_ranks, y_ranks)
+
+	return correlation
+
+
+def correlation_pvalue(correlation: npt.NDArray, counts: npt.NDArray) -> npt.NDArray[np.float64]:
+	"""Two-sided p-value of correlation coefficients under the null hypothesis of no correlation.
+
+	The statistic `r * sqrt((n - 2) / (1 - r^2))` follows a Student t-distribution with `n - 2` degrees of freedom,
+	this is the p-value returned by `scipy.stats.spearmanr`. The p-value is NaN when `n <= 2`.
+
+	Args:
+		correlation (np.ndarray): the correlation coefficients
+		counts (np.ndarray): the number of observations used to compute each coefficient
+
+	Returns:
+		np.ndarray: the p-value of each coefficient
+	"""
+	correlation = np.asarray(correlation, dtype=np.float64)
+	dof = np.asarray(counts, dtype=np.float64) - 2
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		statistic = correlation * np.sqrt((dof / ((correlation + 1) * (1 - correlation))).clip(0))
+		pvalue = 2 * student_t.sf(np.abs(statistic), np.where(dof > 0, dof, np.nan))
+
+	return np.clip(pvalue, 0, 1)
+
+
+def _sort_groups(data: pd.DataFrame, by: list[str]) -> tuple[pd.Index, npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+	# Sorted group keys, the order of the rows sorted by group and the offsets of each group in that order
+	grouped = data.groupby(by, sort=True)
+	group_ids = grouped.ngroup().to_numpy()
+	order = np.argsort(group_ids, kind="stable")
+	order = order[group_ids[order] >= 0]
+
+	indptr = np.zeros(grouped.ngroups + 1, dtype=np.int64)
+	np.cumsum(np.bincount(group_ids[order], minlength=grouped.ngroups), out=indptr[1:])
+
+	return grouped.size().index, order, indptr
+
+
+def grouped_correlations(data: pd.DataFrame, by: list[str], x: str, ys: list[str], pearson: bool = True) -> pd.DataFrame:
+	"""Correlate the column `x` with each of the columns `ys`, within every group of rows of `data`.
+
+	The rows are sorted once by group, and the statistics of all the groups are computed at once. For each
+	column `y` of `ys`, the result contains the columns `{y}_spearman` and `{y}_pvalue` (the p-value of the
+	Spearman correlation), and if `pearson` is True the columns `{y}_corr_coeff` and `{y}_cov`.
+
+	Args:
+		data (pd.DataFrame): the data
+		by (list[str]): the columns defining the groups, rows with a NaN key are ignored (like `DataFrame.groupby`)
+		x (str): the column correlated with all the others
+		ys (list[str]): the columns correlated with `x`
+		pearson (bool): whether to compute the Pearson correlation and the covariance as well
+
+	Returns:
+		pd.DataFrame: one row per group, indexed by the sorted group keys, with a (float) column `count` holding
+		the size of the groups
+	"""
+	index, order, indptr = _sort_groups(data, by)
+	counts = np.diff(indptr)
+
+	x_values = data[x].to_numpy(dtype=np.float64)[order]
+	columns = {"count": counts.astype(np.float64)}
+	for y in ys:
+		y_values = data[y].to_numpy(dtype=np.float64)[order]
+		if pearson:
+			columns[f"{y}_corr_coeff"], columns[f"{y}_cov"] = grouped_pearson(indptr, x_values, y_values)
+		columns[f"{y}_spearman"] = grouped_spearman(indptr, x_values, y_values)
+		columns[f"{y}_pvalue"] = correlation_pvalue(columns[f"{y}_spearman"], counts)
+
+	return pd.DataFrame(columns, index=index)
+
+
+def grouped_quantile(indptr: npt.NDArray[np.int64], values: npt.NDArray, q: float) -> npt.NDArray[np.float64]:
+	"""Compute the `q`-quantile of each segment, with the linear interpolation of `np.quantile`.
+
+	The values must be sorted within each segment. Empty segments get NaN.
+	"""
+	lengths = np.diff(indptr)
+	values = np.append(np.asarray(values, dtype=np.float64), np.nan)  # Padding read by the empty segments
+
+	position = q * (lengths - 1)
+	lower = np.floor(position).astype(np.int64)
+	upper = np.minimum(lower + 1, lengths - 1)
+	weight = position - lower
+
+	empty = lengths == 0
+	lower_values = values[np.where(empty, -1, indptr[:-1] + lower)]
+	upper_values = values[np.where(empty, -1, indptr[:-1] + upper)]
+
+	return lower_values + (upper_values - lower_values) * weight
+
+
+def _permutation_batch(
+	indptr: npt.NDArray[np.int64],
+	x_ranks: npt.NDArray[np.float64],
+	y_ranks: npt.NDArray[np.float64],
+	n_resamples: int,
+	seed: np.random.SeedSequence,
+) -> npt.NDArray[np.int64]:
+	# Number of permutations of each segment whose |correlation| is at least the observed one
+	rng = np.random.default_rng(seed)
+	lengths = np.diff(indptr)
+	segments = segment_ids(indptr)
+	n_segments = len(lengths)
+
+	# The ranks are only permuted, so their mean and variance in each segment do not change
+	centered_x = x_ranks - (segment_sum(indptr, x_ranks) / np.maximum(lengths, 1))[segments]
+	centered_y = y_ranks - (segment_sum(indptr, y_ranks) / np.maximum(lengths, 1))[segments]
+	norm = np.sqrt(segment_sum(indptr, centered_x**2) * segment_sum(indptr, centered_y**2))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		observed = np.abs(segment_sum(indptr, centered_x * centered_y) / norm)
+
+	# Sorting random keys offset by the segment shuffles the elements within each segment
+	permutations = np.argsort(segments + rng.random((n_resamples, len(segments))), axis=1)
+	batch_segments = (segments + n_segments * np.arange(n_resamples)[:, None]).ravel()
+	covariances = np.bincount(
+		batch_segments, weights=(centered_x * centered_y[permutations]).ravel(), minlength=n_resamples * n_segments
+	).reshape(n_resamples, n_segments)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return (np.abs(covariances / norm) >= observed * (1 - 1e-12)).sum(axis=0)
+
+
+def _tie_positions(indptr: npt.NDArray[np.int64], values: npt.NDArray[np.float64]) -> npt.NDArray[np.int64]:
+	# Position in its segment of the first of the values equal to each value, once the segment is sorted
+	segments = segment_ids(indptr)
+	order = np.lexsort((values, segments))
+	sorted_values = values[order]
+	run_starts = np.ones(len(values), dtype=bool)
+	run_starts[1:] = (segments[order][1:] != segments[order][:-1]) | (sorted_values[1:] != sorted_values[:-1])
+
+	first_positions = np.maximum.accumulate(np.where(run_starts, np.arange(len(values)), 0))
+	positions = np.empty(len(values), dtype=np.int64)
+	positions[order] = first_positions - indptr[segments[order]]
+	return positions
+
+
+def _bootstrap_batch(
+	indptr: npt.NDArray[np.int64],
+	x: npt.NDArray[np.float64],
+	y: npt.NDArray[np.float64],
+	n_resamples: int,
+	seed: np.random.SeedSequence,
+) -> npt.NDArray[np.float64]:
+	# Spearman correlation of each segment for `n_resamples` resamples (with replacement) of each segment.
+	# A resample only contains values of the original segment, so the rank of a drawn value is obtained by counting
+	# the drawn values at each position of the sorted segment, without sorting the resample.
+	rng = np.random.default_rng(seed)
+	lengths = np.diff(indptr)
+	segments = segment_ids(indptr)
+	n_values, n_segments = len(segments), len(lengths)
+
+	sources = indptr[segments] + np.floor(rng.random((n_resamples, n_values)) * lengths[segments]).astype(np.int64)
+	offsets = n_values * np.arange(n_resamples)[:, None]
+	segment_starts = (indptr[segments] + offsets).ravel()
+
+	def resampled_ranks(values):
+		slots = (indptr[segments][sources] + _tie_positions(indptr, values)[sources] + offsets).ravel()
+		counts = np.bincount(slots, minlength=n_resamples * n_values)
+		smaller = np.cumsum(counts) - counts
+		return 1 + smaller[slots] - smaller[segment_starts] + (counts[slots] - 1) / 2
+
+	# Average ranks have a mean of (n + 1) / 2
+	centered_x = resampled_ranks(x) - np.tile((lengths[segments] + 1) / 2, n_resamples)
+	centered_y = resampled_ranks(y) - np.tile((lengths[segments] + 1) / 2, n_resamples)
+
+	batch_segments = (segments + n_segments * np.arange(n_resamples)[:, None]).ravel()
+	size = n_resamples * n_segments
+	covariance = np.bincount(batch_segments, weights=centered_x * centered_y, minlength=size)
+	variance_x = np.bincount(batch_segments, weights=centered_x**2, minlength=size)
+	variance_y = np.bincount(batch_segments, weights=centered_y**2, minlength=size)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		correlation = np.clip(covariance / np.sqrt(variance_x * variance_y), -1, 1)
+	correlation[(variance_x <= 0) | (variance_y <= 0)] = np.nan
+
+	return correlation.reshape(n_resamples, n_segments)
+
+
+def run_batches(function, batch_sizes: list[int], seeds: list[np.random.SeedSequence], n_workers: int, *args) -> list:
+	"""Call `function(*args, size, seed)` for each batch of resamples, possibly in several processes.
+
+	Since each batch has its own random stream, the results do not depend on the number of processes.
+	"""
+	if n_workers <= 1:
+		return [function(*args, size, seed) for size, seed in zip(batch_sizes, seeds)]
+
+	with ProcessPoolExecutor(max_workers=n_workers) as executor:
+		futures = [executor.submit(function, *args, size, seed) for size, seed in zip(batch_sizes, seeds)]
+		return [future.result() for future in futures]
+
+
+def resampled_spearman(
+	indptr: npt.NDArray[np.int64],
+	x: npt.NDArray,
+	y: npt.NDArray,
+	n_permutations: int = 1000,
+	n_bootstraps: int = 1000,
+	confidence: float = 0.95,
+	seed: int = 0,
+	n_workers: int = 1,
+	max_batch_elements: int = 10_000_000,
+) -> dict[str, npt.NDArray[np.float64]]:
+	"""Compute permutation p-values and bootstrap confidence intervals of the Spearman correlation of every segment.
+
+	All the segments are resampled at once: each batch of resamples is a matrix of random indices over the flat
+	values, with one row per resample. The batches get independent random streams spawned from `seed`, so that
+	the results do not depend on `n_workers`.
+
+	Args:
+		indptr (np.ndarray): offsets of each segment in `x` and `y`
+		x (np.ndarray): the flat values of the first variable
+		y (np.ndarray): the flat values of the second variable
+		n_permutations (int): the number of permutations of `y` within each segment, 0 to skip the p-values
+		n_bootstraps (int): the number of bootstrap resamples of each segment, 0 to skip the confidence intervals
+		confidence (float): the level of the (percentile) confidence intervals
+		seed (int): the seed of the random number generator
+		n_workers (int): the number of processes used to run the batches, 1 runs them in the current process
+		max_batch_elements (int): the maximum size of the matrix of random indices of a batch, to bound memory usage
+
+	Returns:
+		dict[str, np.ndarray]: for each segment, the `spearman` correlation, the two-sided `permutation_pvalue`
+		`(1 + #{|r*| >= |r|}) / (1 + n_permutations)` and the bootstrap interval `ci_low`/`ci_high`. The values are
+		NaN where the correlation is not defined.
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	spearman = grouped_spearman(indptr, x, y)
+	result = {"spearman": spearman}
+
+	batch_size = max(1, max_batch_elements // max(len(x), 1))
+	permutation_seed, bootstrap_seed = np.random.SeedSequence(seed).spawn(2)
+
+	if n_permutations > 0:
+		sizes = [min(batch_size, n_permutations - start) for start in range(0, n_permutations, batch_size)]
+		x_ranks, y_ranks = grouped_rank(indptr, x), grouped_rank(indptr, y)
+		counts = run_batches(_permutation_batch, sizes, permutation_seed.spawn(len(sizes)), n_workers, indptr, x_ranks, y_ranks)
+		pvalue = (1 + np.sum(counts, axis=0)) / (1 + n_permutations)
+		pvalue[np.isnan(spearman)] = np.nan
+		result["permutation_pvalue"] = pvalue
+
+	if n_bootstraps > 0:
+		sizes = [min(batch_size, n_bootstraps - start) for start in range(0, n_bootstraps, batch_size)]
+		correlations = np.vstack(run_batches(_bootstrap_batch, sizes, bootstrap_seed.spawn(len(sizes)), n_workers, indptr, x, y))
+		# Resamples where the correlation is not defined (e.g. a single value drawn several times) are ignored
+		with warnings.catch_warnings():
+			warnings.simplefilter(action="ignore", category=RuntimeWarning)
+			ci_low, ci_high = np.nanquantile(correlations, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0)
+		ci_low[np.isnan(spearman)] = np.nan
+		ci_high[np.isnan(spearman)] = np.nan
+		result["ci_low"], result["ci_high"] = ci_low, ci_high
+
+	return result
+
+
+def grouped_resampled_spearman(data: pd.DataFrame, by: list[str], x: str, ys: list[str], **kwargs) -> pd.DataFrame:
+	"""Resampling version of `grouped_correlations`, see `resampled_spearman` for the parameters.
+
+	Returns:
+		pd.DataFrame: one row per group, indexed by the sorted group keys, with the column `count` and, for each
+		column `y` of `ys`, the columns `{y}_spearman`, `{y}_permutation_pvalue`, `{y}_ci_low` and `{y}_ci_high`
+	"""
+	index, order, indptr = _sort_groups(data, by)
+	counts = np.diff(indptr)
+
+	x_values = data[x].to_numpy(dtype=np.float64)[order]
+	columns = {"count": counts.astype(np.float64)}
+	for y in ys:
+		stats = resampled_spearman(indptr, x_values, data[y].to_numpy(dtype=np.float64)[order], **kwargs)
+		columns.update({f"{y}_{name}": values for name, values in stats.items()})
+
+	return pd.DataFrame(columns, index=index)
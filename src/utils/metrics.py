@@ -2,10 +2,14 @@ import warnings
 
 import networkx as nx
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 from scipy.stats import ConstantInputWarning, spearmanr
 
+from src.utils.cache import artifact_key, cached_table
 from src.utils.data import explode_paths
+from src.utils.data.paths import PathArrays
+from src.utils.grouped_stats import grouped_correlations, grouped_resampled_spearman, grouped_quantile, segment_ids
 
 
 def pagerank(graph: nx.Graph) -> pd.DataFrame:
@@ -20,36 +24,89 @@ def pagerank(graph: nx.Graph) -> pd.DataFrame:
 	return graph_pagerank
 
 
-def average_on_paths(n_bins: int, paths: pd.DataFrame, graph_pagerank:pd.DataFrame) -> tuple[np.array, np.array]:
+def generality_bins(
+	n_bins: int,
+	paths: pd.DataFrame,
+	graph_pagerank: pd.DataFrame,
+	max_length: int = 20,
+	path_arrays: PathArrays | None = None,
+	quantiles: tuple[float, ...] = (),
+) -> pd.DataFrame:
+	"""Aggregate the generality score of the articles of the paths by their relative position in the path.
 
+	The step `i` of a path with `L` articles (after removing the '<') is at the fraction `i / (L - 1)` of the path, and
+	falls in the bin `int(fraction * n_bins)`, so that the first and last articles are in the first and last bins.
+
+	Args:
+		n_bins (int): the number of bins, `n_bins + 1` bins are returned as the last one holds the last articles
+		paths (pd.DataFrame): the paths, e.g. `paths_finished` as returned by `load_graph_data`
+		graph_pagerank (pd.DataFrame): the generality score of the articles, as returned by `pagerank`
+		max_length (int): longer paths (including the '<') are considered as noise and ignored
+		path_arrays (PathArrays): the precomputed arrays of `paths` (e.g. `paths_finished_arrays`), computed if None
+		quantiles (tuple[float, ...]): quantiles of the scores to compute in each bin
+
+	Raises:
+		KeyError: if an article of the paths has no generality score
+
+	Returns:
+		pd.DataFrame: one row per bin, with the columns `percent` (start of the bin), `mean`, `std`, `count` and
+		`q{quantile}` for each of the quantiles. The mean, std and quantiles of empty bins are NaN.
+	"""
 	article_gen_score = graph_pagerank.set_index('Article')['Generality_score']
 
-	# Get path finished and filter so that we only keep short paths (other are noise)
-	paths = paths[paths['path'].apply(len) <= 20]
-	#Remove < from path (but keep the articles that the person attempted to go to)
-	paths['path'] = paths['path'].apply(lambda x: [u for u in x if u != '<'])
+	if path_arrays is None:
+		path_arrays = PathArrays.from_paths(paths['path'])
+	# Keep only short paths (other are noise)
+	path_arrays = path_arrays.take(np.flatnonzero(path_arrays.lengths('raw') <= max_length))
 
+	# Remove < from path (but keep the articles that the person attempted to go to)
+	indptr, article_ids = path_arrays.variant('dropped')
+	score_ids = article_gen_score.index.get_indexer(path_arrays.articles)[article_ids]
+	if (score_ids < 0).any():
+		raise KeyError(f"Articles without a generality score: {sorted(set(path_arrays.articles[article_ids[score_ids < 0]]))[:10]}")
+	scores = article_gen_score.to_numpy(dtype=np.float64)[score_ids]
 
-	paths['Generality_score'] = paths['path'].apply(
-    lambda path: article_gen_score.loc[path].tolist())
-	scores_bins = [[] for _ in range(n_bins + 1)]
+	# Fraction of each step in its path, exactly as `np.linspace(0, 1, L)`
+	lengths = np.diff(indptr)
+	segments = segment_ids(indptr)
+	steps = np.arange(len(article_ids)) - indptr[segments]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		fractions = steps * (1.0 / (lengths[segments] - 1))
+	fractions[steps == lengths[segments] - 1] = 1.0
+	fractions[lengths[segments] == 1] = 0.0
+	bins = (fractions * n_bins).astype(np.int64)
 
-	# We have bins for every steps then add the scores that fall in that bin
-	# For ex. if the path is of length 5 we will add step 1 to 1st bin, step 2 to 3rd, etc...
-	for _, path in paths.iterrows():
-		# This is the previously computed path of generality scores (for each step)
-		generality_scores = path["Generality_score"]
-		bins = np.linspace(0, 1, len(generality_scores))
+	counts = np.bincount(bins, minlength=n_bins + 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		mean = np.bincount(bins, weights=scores, minlength=n_bins + 1) / counts
+		std = np.sqrt(np.bincount(bins, weights=(scores - mean[bins]) ** 2, minlength=n_bins + 1) / counts)
 
-		for fraction, score in zip(bins, generality_scores):
-			bin_index = int(fraction * n_bins)  # Find bin where this falls
-			scores_bins[bin_index].append(score)
+	result = pd.DataFrame(dict(percent=[(100 * i / n_bins) for i in range(n_bins + 1)], mean=mean, std=std, count=counts))
 
-	scores = [np.mean(scores) for scores in scores_bins]
+	if quantiles:
+		order = np.lexsort((scores, bins))
+		bin_indptr = np.zeros(n_bins + 2, dtype=np.int64)
+		np.cumsum(counts, out=bin_indptr[1:])
+		for q in quantiles:
+			result[f'q{q}'] = grouped_quantile(bin_indptr, scores[order], q)
 
-	percent = [(100 * i / n_bins) for i in range(n_bins + 1)]
+	return result
 
-	return scores, percent
+
+def average_on_paths(
+	n_bins: int, paths: pd.DataFrame, graph_pagerank: pd.DataFrame, path_arrays: PathArrays | None = None
+) -> tuple[list[float], list[float]]:
+	"""Average the generality score of the articles of the paths by their relative position in the path.
+
+	See `generality_bins`, the paths are not modified.
+
+	Returns:
+		scores (list[float]): the mean generality score of each of the `n_bins + 1` bins
+		percent (list[float]): the start of each bin, in percent of the path
+	"""
+	bins = generality_bins(n_bins, paths, graph_pagerank, path_arrays=path_arrays)
+
+	return bins['mean'].tolist(), bins['percent'].tolist()
 
 
 def compute_correlation_between_rank_and_path_length(
@@ -84,54 +141,170 @@ def compute_correlation_between_rank_and_path_length(
 	return vals
 
 
-def rank_length_analysis(paths: pd.DataFrame) -> pd.DataFrame:
+def rank_length_analysis(paths: pd.DataFrame, n_resamples: int = 0, n_workers: int = 1) -> pd.DataFrame:
 	"""Compute the correlation between the columns `rank` and `path_length` for distinct pair of articles.
 
 	Args:
 			paths: pd.DataFrame, either paths_finished or paths_unfinished as returned by `load_graph_data`
+			n_resamples: int, if positive, the number of permutations and bootstrap resamples used to add a permutation
+			p-value and a confidence interval of the Spearman correlation (see `resampled_spearman`)
+			n_workers: int, the number of processes used for the resampling
 
 	Returns:
 			corr_data	pd.DataFrame, correlation data. One pair of articles per row.
 			The correlation coefficient is in the column `correlation_coefficient` and the column
-			`count` is the number of times the given pair was found.
+			`count` is the number of times the given pair was found. With resampling, the columns
+			`permutation_pvalue`, `ci_low` and `ci_high` are added.
 
 	"""
 	# We attempt to discriminate games were the player might not have been playing seriously because they
 	# would bring a significant unbalance to our dataset
 	PATH_LENGTH_THRESHOLD = 50
 
-	corr_data = (
-		explode_paths(paths, PATH_LENGTH_THRESHOLD)
-		.groupby(["source", "target"])[["source", "target", "rank", "path_length"]]
-		.apply(compute_correlation_between_rank_and_path_length)
-		.reset_index()
+	# Same values as applying `compute_correlation_between_rank_and_path_length` to every group, computed at once
+	exploded_paths = explode_paths(paths, PATH_LENGTH_THRESHOLD)
+	stats = grouped_correlations(exploded_paths, ["source", "target"], "rank", ["path_length"])
+	corr_data = pd.DataFrame(
+		dict(
+			corr_coeff=stats["path_length_corr_coeff"],
+			cov=stats["path_length_cov"],
+			spearman=stats["path_length_spearman"],
+			pvalue=stats["path_length_pvalue"],
+			count=stats["count"],
+		),
 	)
 
-	return corr_data
+	if n_resamples > 0:
+		resampled = grouped_resampled_spearman(
+			exploded_paths,
+			["source", "target"],
+			"rank",
+			["path_length"],
+			n_permutations=n_resamples,
+			n_bootstraps=n_resamples,
+			n_workers=n_workers,
+		)
+		for name in ["permutation_pvalue", "ci_low", "ci_high"]:
+			corr_data[name] = resampled[f"path_length_{name}"]
+
+	return corr_data.reset_index()
+
+
+def rank_length_threshold_sweep(paths: pd.DataFrame, thresholds: npt.ArrayLike) -> pd.DataFrame:
+	"""Compute the Pearson correlation between `rank` and `path_length` for each pair of articles, for many thresholds.
+
+	This is `rank_length_analysis` (correlation and covariance only) for every value of the threshold on the length of
+	the paths, which is fixed to 50 there. The paths are exploded once, and the rows of each pair of articles are
+	sorted by the length of the path they come from: the statistics for a threshold are then read from the cumulative
+	moments of each pair, at the position given by `searchsorted`.
+
+	Args:
+			paths: pd.DataFrame, either paths_finished or paths_unfinished as returned by `load_graph_data`
+			thresholds: array-like, the thresholds on the length of the paths
+
+	Returns:
+			pd.DataFrame: one row per threshold and pair of articles found in the paths under that threshold, with the
+			columns `threshold`, `source`, `target`, `corr_coeff`, `cov` and `count`
+	"""
+	thresholds = np.sort(np.asarray(thresholds, dtype=np.int64))
+	exploded_paths = explode_paths(paths, int(thresholds.max(initial=0)))
+
+	grouped = exploded_paths.groupby(["source", "target"], sort=True)
+	group_ids = grouped.ngroup().to_numpy()
+	rank = exploded_paths["rank"].to_numpy(dtype=np.float64)
+	length = exploded_paths["path_length"].to_numpy(dtype=np.float64)
+	# The length of the path each row comes from
+	full_length = exploded_paths["path_length"].to_numpy(dtype=np.int64) + exploded_paths["rank"].to_numpy(dtype=np.int64)
+
+	# Sort by pair of articles, then by the length of the path
+	max_length = int(full_length.max(initial=0)) + 1
+	sort_keys = group_ids * max_length + full_length
+	order = np.argsort(sort_keys, kind="stable")
+	sort_keys = sort_keys[order]
+
+	# Cumulative moments, with a leading 0 so that the moments of a range are a difference
+	rank, length = rank[order], length[order]
+	moments = np.vstack([np.ones(len(order)), rank, length, rank**2, length**2, rank * length])
+	cumulated = np.hstack([np.zeros((len(moments), 1)), np.cumsum(moments, axis=1)])
+
+	group_starts = np.searchsorted(sort_keys, np.arange(grouped.ngroups) * max_length, side="left")
+	group_index = grouped.size().index.to_frame(index=False)
+
+	results = []
+	for threshold in thresholds:
+		group_ends = np.searchsorted(
+			sort_keys, np.arange(grouped.ngroups) * max_length + min(threshold, max_length - 1), side="right"
+		)
+		count, sum_rank, sum_length, sum_rank2, sum_length2, sum_product = cumulated[:, group_ends] - cumulated[:, group_starts]
 
+		with np.errstate(divide="ignore", invalid="ignore"):
+			covariance = (sum_product - sum_rank * sum_length / count) / (count - 1)
+			variance_rank = (sum_rank2 - sum_rank**2 / count) / (count - 1)
+			variance_length = (sum_length2 - sum_length**2 / count) / (count - 1)
+			corr_coeff = np.clip(covariance / np.sqrt(variance_rank * variance_length), -1, 1)
+		covariance[count < 2] = np.nan
+		# Relative tolerance for the cancellation of the raw moments of constant columns
+		constant = (variance_rank <= 1e-12 * np.abs(sum_rank2 / count)) | (variance_length <= 1e-12 * np.abs(sum_length2 / count))
+		corr_coeff[(count < 2) | constant] = np.nan
 
-def explode_paths_and_compute_all_scores(paths: pd.DataFrame, compute: bool = False, write: bool = False) -> pd.DataFrame:
-	if compute:
-		from src.utils.data import explode_paths
-		df = explode_paths(paths, clear_backticks=True)[['source', 'target', 'path', 'path_length', 'rank']][
-			lambda x: x['source'] != "<"
-		]
-		df['sub_path'] = df.apply(
-			func=lambda entry: entry['path'][entry['rank']:],
-			axis='columns',
+		present = count > 0
+		result = group_index[present].assign(
+			threshold=threshold, corr_coeff=corr_coeff[present], cov=covariance[present], count=count[present]
 		)
-		hur, tlr, sis = 'hub_usage_ratio', 'top_link_ratio', 'semantic_increase_score'
-		from src.utils.strategies.hub_focused_strategy import compute_hub_usage_ratio
-		df[hur] = df['sub_path'].apply(func=compute_hub_usage_ratio)
-		from src.utils.strategies.semantic_strategy import semantic_increase_score
-		df[sis] = df['sub_path'].apply(func=semantic_increase_score)
-		from src.utils.strategies.link_strategy import top_link_ratio
-		df[tlr] = df['sub_path'].apply(func=top_link_ratio)
-	else:
-		df = pd.read_csv('./data/generated/strategy_comparison/exploded_paths_data.csv')
-	if write:
-		df.to_csv('./data/generated/strategy_comparison/exploded_paths_data.csv')
-	return df
+		results.append(result)
+
+	return pd.concat(results, ignore_index=True)[["threshold", "source", "target", "corr_coeff", "cov", "count"]]
+
+
+# Version of the strategy scores computed from the exploded paths, to be increased when their computation changes
+STRATEGY_SCORES_VERSION = 1
+
+
+def _strategy_scores_key(paths: pd.DataFrame) -> str:
+	# Everything the strategy scores of the exploded paths depend on
+	from src.utils.strategies.hub_focused_strategy import get_top_hubs
+	from src.utils.strategies.semantic_strategy import semantic_backend_key, tf_idf_model_key
+
+	return artifact_key(
+		paths[['path', 'target', 'path_length']], sorted(get_top_hubs()), tf_idf_model_key(), semantic_backend_key(), STRATEGY_SCORES_VERSION
+	)
+
+
+def explode_paths_and_compute_all_scores(
+	paths: pd.DataFrame, path_arrays: PathArrays | None = None, columns: list[str] | None = None
+) -> pd.DataFrame:
+	"""Explode the cleaned paths (see `explode_paths`) and compute the strategy scores of the rest of the path at each step.
+
+	The scores of all the suffixes of the paths are computed at once by `suffix_scores`. The result is stored in
+	the artifact cache (see `cached_table`) and only recomputed when the paths or the parameters change.
+
+	Args:
+		paths: pd.DataFrame, paths_finished as returned by `load_graph_data`
+		path_arrays: PathArrays, the precomputed arrays of `paths` (e.g. `paths_finished_arrays`), computed if None
+		columns: list[str], if given only these columns are loaded
+
+	Returns:
+		pd.DataFrame: one row per step of each path, with the columns `source`, `target`, `path`, `path_length`,
+		`rank`, `hub_usage_ratio`, `top_link_ratio` and `semantic_increase_score`
+	"""
+
+	def compute() -> pd.DataFrame:
+		from src.utils.strategies.semantic_strategy import get_article_vectors
+		from src.utils.strategies.suffix_scores import suffix_scores
+
+		arrays = path_arrays
+		if arrays is None:
+			_, article_to_index = get_article_vectors()
+			arrays = PathArrays.from_paths(paths['path'], list(article_to_index))
+		df = explode_paths(paths, clear_backticks=True, path_arrays=arrays)[['source', 'target', 'path', 'path_length', 'rank']]
+
+		scores = suffix_scores(arrays.loc(df.index.unique()))
+		scores = scores.set_index('rank', append=True).reindex(pd.MultiIndex.from_arrays([df.index, df['rank']]))
+		for score in ['hub_usage_ratio', 'top_link_ratio', 'semantic_increase_score']:
+			df[score] = scores[score].to_numpy()
+		return df
+
+	return cached_table('exploded_paths_scores', _strategy_scores_key(paths), compute, columns=columns)
 
 def compute_correlation_between_scores_and_game_length(path_group: pd.DataFrame) -> pd.Series:
 	count = len(path_group)
@@ -147,17 +320,54 @@ def compute_correlation_between_scores_and_game_length(path_group: pd.DataFrame)
 		res.update({score + "_corr_coeff": corr_coeff, score + "_pvalue": pvalue})
 	return pd.Series(res)
 
-def scores_vs_length_analysis(graph_data, compute: bool = False, write: bool = False) -> dict[str, pd.DataFrame]:
-	df_exploded = explode_paths_and_compute_all_scores(graph_data['paths_finished'])
-	if compute:
-		df = df_exploded.groupby(['source', 'target']).apply(compute_correlation_between_scores_and_game_length).reset_index()
-	else:
-		df = pd.read_csv('./data/generated/strategy_comparison/general_scores.csv')
-	if write:
-		df.to_csv('./data/generated/strategy_comparison/general_scores.csv')
+def scores_vs_length_analysis(graph_data, n_resamples: int = 0, n_workers: int = 1) -> dict[str, pd.DataFrame]:
+	"""Compute the Spearman correlation between each strategy score of the rest of the path and the remaining length.
+
+	Args:
+		graph_data: the data returned by `load_graph_data`
+		n_resamples: int, if positive, the number of permutations and bootstrap resamples used to add the columns
+		`permutation_pvalue`, `ci_low` and `ci_high` (see `resampled_spearman`)
+		n_workers: int, the number of processes used for the resampling
+
+	Returns:
+		dict[str, pd.DataFrame]: for each score, one row per pair of articles with the columns `source`, `target`,
+		`count`, `spearman` and `pvalue`
+	"""
+	scores = ['hub_usage_ratio', 'top_link_ratio', 'semantic_increase_score']
+	resampled_names = ['permutation_pvalue', 'ci_low', 'ci_high'] if n_resamples > 0 else []
+
+	def compute() -> pd.DataFrame:
+		df_exploded = explode_paths_and_compute_all_scores(
+			graph_data['paths_finished'],
+			path_arrays=graph_data['paths_finished_arrays'],
+			columns=['source', 'target', 'path_length', *scores],
+		)
+		# Same values as applying `compute_correlation_between_scores_and_game_length` to every group
+		stats = grouped_correlations(df_exploded, ['source', 'target'], 'path_length', scores, pearson=False)
+		columns = {'count': stats['count']}
+		for score in scores:
+			columns.update({score + "_corr_coeff": stats[score + "_spearman"], score + "_pvalue": stats[score + "_pvalue"]})
+
+		if n_resamples > 0:
+			resampled = grouped_resampled_spearman(
+				df_exploded,
+				['source', 'target'],
+				'path_length',
+				scores,
+				n_permutations=n_resamples,
+				n_bootstraps=n_resamples,
+				n_workers=n_workers,
+			)
+			columns.update({f"{score}_{name}": resampled[f"{score}_{name}"] for score in scores for name in resampled_names})
+		return pd.DataFrame(columns).reset_index()
+
+	key = artifact_key(_strategy_scores_key(graph_data['paths_finished']), n_resamples)
+	df = cached_table('general_scores', key, compute)
 	scores_dfs = {}
-	for score in ['hub_usage_ratio', 'top_link_ratio', 'semantic_increase_score']:
+	for score in scores:
 		scores_dfs[score] = df[['source', 'target', 'count']].copy()
 		scores_dfs[score]['spearman'] = df[score + '_corr_coeff']
 		scores_dfs[score]['pvalue'] = df[score + '_pvalue']
-	return scores_dfs
\ No newline at end of file
+		for name in resampled_names:
+			scores_dfs[score][name] = df[f"{score}_{name}"]
+	return scores_dfs
@@ -0,0 +1,481 @@
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import statsmodels.formula.api as smf
+from scipy import sparse
+from scipy.optimize import minimize_scalar
+from scipy.stats import norm
+from statsmodels.regression.mixed_linear_model import MixedLMResults
+
+from src.utils.cache import artifact_key, cached_table
+from src.utils.grouped_stats import run_batches
+
+# Bounds of the log of the ratio between the variance of the random intercepts and the residual variance
+_LOG_RATIO_BOUNDS = (-25.0, 25.0)
+
+# Version of the stored model fits, to be increased when the content of the stored tables changes
+MODEL_FIT_VERSION = 1
+
+
+class RandomInterceptResults:
+	"""Results of `fit_random_intercept`, with the same names as the `MixedLMResults` of statsmodels.
+
+	The parameters are the fixed effects followed by "Group Var", the variance of the random intercepts divided by
+	the residual variance (`scale`), as in statsmodels. The standard errors and p-values (Wald z-tests) come from the
+	Hessian of the log-likelihood profiled over the residual variance, also as in statsmodels.
+	"""
+
+	def __init__(
+		self,
+		fe_params: pd.Series,
+		ratio: float,
+		cov_params: pd.DataFrame,
+		scale: float,
+		llf: float,
+		random_effects: dict,
+		method: str,
+		nobs: int,
+		converged: bool,
+	):
+		self.fe_params = fe_params
+		self.params = pd.concat([fe_params, pd.Series({"Group Var": ratio})])
+		self.normalized_ratio = ratio
+		self._cov_params = cov_params
+		self.bse = pd.Series(np.sqrt(np.diag(cov_params)), index=self.params.index)
+		self.bse_fe = self.bse[fe_params.index]
+		self.tvalues = self.params / self.bse
+		self.pvalues = pd.Series(2 * norm.sf(np.abs(self.tvalues)), index=self.params.index)
+		self.scale = scale
+		self.cov_re = pd.DataFrame([[ratio * scale]], index=["Group"], columns=["Group"])
+		self.llf = llf
+		self.random_effects = random_effects
+		self.method = method
+		self.nobs = nobs
+		self.converged = converged
+
+	def cov_params(self) -> pd.DataFrame:
+		"""Return the covariance matrix of the parameters."""
+		return self._cov_params
+
+
+def _group_statistics(
+	endog: npt.NDArray[np.float64], exog: npt.NDArray[np.float64], codes: npt.NDArray[np.int64], n_groups: int
+) -> dict[str, npt.NDArray[np.float64]]:
+	# Everything the likelihood depends on: the global cross products and the sums of each group. Each group is
+	# counted `copies` times in the likelihood, which is different from 1 for the resamples of `cluster_bootstrap`.
+	return dict(
+		copies=np.ones(n_groups),
+		counts=np.bincount(codes, minlength=n_groups).astype(np.float64),
+		x_sums=np.column_stack([np.bincount(codes, weights=column, minlength=n_groups) for column in exog.T]),
+		y_sums=np.bincount(codes, weights=endog, minlength=n_groups),
+		xx=exog.T @ exog,
+		xy=exog.T @ endog,
+		yy=endog @ endog,
+	)
+
+
+def _profile(stats: dict, ratio: float) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], float]:
+	# Generalized least squares for a given variance ratio: the inverse of the covariance of a group of size n
+	# is (I - w 11') / scale with w = ratio / (1 + n * ratio), so only the sums of each group are needed
+	weights = stats["copies"] * ratio / (1 + stats["counts"] * ratio)
+	xvx = stats["xx"] - (stats["x_sums"].T * weights) @ stats["x_sums"]
+	xvy = stats["xy"] - stats["x_sums"].T @ (weights * stats["y_sums"])
+	fe_params = np.linalg.solve(xvx, xvy)
+	# Quadratic form of the residuals
+	qf = stats["yy"] - np.sum(weights * stats["y_sums"] ** 2) - xvy @ fe_params
+	return fe_params, xvx, qf
+
+
+def _negative_loglike(stats: dict, ratio: float, reml: bool) -> float:
+	# Log-likelihood profiled over the fixed effects and the residual variance, with the constants of statsmodels
+	_, xvx, qf = _profile(stats, ratio)
+	n = stats["copies"] @ stats["counts"]
+	dof = n - len(xvx) if reml else n
+	loglike = -0.5 * stats["copies"] @ np.log1p(stats["counts"] * ratio) - dof / 2 * (np.log(2 * np.pi * qf / dof) + 1)
+	if reml:
+		loglike -= 0.5 * np.linalg.slogdet(xvx)[1]
+	return -loglike
+
+
+def _hessian(
+	stats: dict, ratio: float, fe_params: npt.NDArray[np.float64], xvx: npt.NDArray, qf: float, reml: bool
+) -> npt.NDArray:
+	# Hessian of the log-likelihood profiled over the residual variance, with respect to the fixed effects and the
+	# (unscaled) variance ratio, at the optimum
+	copies, counts, x_sums = stats["copies"], stats["counts"], stats["x_sums"]
+	dof = copies @ counts - len(fe_params) if reml else copies @ counts
+	group_resid = stats["y_sums"] - x_sums @ fe_params
+	# First and second derivatives of the weights of `_profile` with respect to the ratio
+	d_weights = copies / (1 + counts * ratio) ** 2
+	d2_weights = -2 * copies * counts / (1 + counts * ratio) ** 3
+
+	d_qf = -np.sum(d_weights * group_resid**2)
+	d2_qf = -np.sum(d2_weights * group_resid**2)
+
+	hess_fe = -dof * xvx / qf
+	hess_fere = -dof / qf * (x_sums.T @ (d_weights * group_resid))
+	hess_re = 0.5 * copies @ (counts**2 / (1 + counts * ratio) ** 2) - dof / 2 * (d2_qf / qf - d_qf**2 / qf**2)
+	if reml:
+		d_xvx = -(x_sums.T * d_weights) @ x_sums
+		d2_xvx = -(x_sums.T * d2_weights) @ x_sums
+		first = np.linalg.solve(xvx, d_xvx)
+		hess_re -= 0.5 * (np.trace(np.linalg.solve(xvx, d2_xvx)) - np.trace(first @ first))
+
+	p = len(fe_params)
+	hessian = np.empty((p + 1, p + 1))
+	hessian[:p, :p] = hess_fe
+	hessian[:p, p] = hessian[p, :p] = hess_fere
+	hessian[p, p] = hess_re
+	return hessian
+
+
+def _fit_ratio(stats: dict, reml: bool) -> tuple[float, bool]:
+	# Maximize the profiled log-likelihood over the variance ratio, returns the ratio and whether it converged
+	optimum = minimize_scalar(
+		lambda log_ratio: _negative_loglike(stats, np.exp(log_ratio), reml),
+		bounds=_LOG_RATIO_BOUNDS,
+		method="bounded",
+		options=dict(xatol=1e-10),
+	)
+	# The optimum may be on the boundary of the parameter space
+	if _negative_loglike(stats, 0.0, reml) <= optimum.fun:
+		return 0.0, bool(optimum.success)
+	return float(np.exp(optimum.x)), bool(optimum.success)
+
+
+def fit_random_intercept(
+	endog: pd.Series, exog: pd.DataFrame, groups: npt.ArrayLike, reml: bool = True
+) -> RandomInterceptResults:
+	"""Fit a linear model with a random intercept per group, by REML or maximum likelihood.
+
+	This is the model fitted by `statsmodels.MixedLM(endog, exog, groups)`, but the likelihood only depends on the
+	sums of each group, and the fixed effects and residual variance have a closed form for a given ratio between
+	the variance of the intercepts and the residual variance. Only that ratio is optimized, in one dimension, so the
+	cost does not grow with the number of groups beyond the computation of their sums.
+
+	Args:
+		endog (pd.Series): the dependent variable
+		exog (pd.DataFrame): the design matrix of the fixed effects
+		groups (array-like): the group of each row
+		reml (bool): whether to maximize the restricted likelihood (REML) instead of the likelihood (ML)
+
+	Returns:
+		RandomInterceptResults: the fixed effects, their standard errors and p-values, and the random effects
+	"""
+	codes, labels = pd.factorize(np.asarray(groups), sort=True)
+	stats = _group_statistics(
+		np.asarray(endog, dtype=np.float64), np.asarray(exog, dtype=np.float64), codes.astype(np.int64), len(labels)
+	)
+
+	ratio, converged = _fit_ratio(stats, reml)
+	fe_params, xvx, qf = _profile(stats, ratio)
+	n = stats["counts"].sum()
+	scale = qf / (n - len(fe_params) if reml else n)
+
+	names = [*exog.columns, "Group Var"]
+	cov_params = pd.DataFrame(np.linalg.inv(-_hessian(stats, ratio, fe_params, xvx, qf, reml)), index=names, columns=names)
+
+	# Conditional means of the random intercepts, shrunk towards 0 for the small groups
+	group_resid = stats["y_sums"] - stats["x_sums"] @ fe_params
+	intercepts = ratio / (1 + stats["counts"] * ratio) * group_resid
+	random_effects = {label: pd.Series([intercept], index=["Group"]) for label, intercept in zip(labels, intercepts)}
+
+	return RandomInterceptResults(
+		fe_params=pd.Series(fe_params, index=exog.columns),
+		ratio=ratio,
+		cov_params=cov_params,
+		scale=scale,
+		llf=-_negative_loglike(stats, ratio, reml),
+		random_effects=random_effects,
+		method="REML" if reml else "ML",
+		nobs=int(n),
+		converged=converged,
+	)
+
+
+def random_intercept_from_formula(formula: str, data: pd.DataFrame, groups: str, reml: bool = True) -> RandomInterceptResults:
+	"""Fit a random intercept model from a formula, like `smf.mixedlm(formula, data, groups=data[groups]).fit()`.
+
+	Args:
+		formula (str): the formula of the fixed effects
+		data (pd.DataFrame): the data
+		groups (str): the column of `data` containing the groups
+		reml (bool): whether to maximize the restricted likelihood (REML) instead of the likelihood (ML)
+
+	Returns:
+		RandomInterceptResults: the results of the fit
+	"""
+	# Only used to build the design matrix, missing values are rejected like in `smf.mixedlm`
+	design = smf.ols(formula, data=data, missing="raise")
+	endog = pd.Series(design.endog, name=design.endog_names)
+	exog = pd.DataFrame(design.exog, columns=design.exog_names)
+	return fit_random_intercept(endog, exog, data[groups], reml=reml)
+
+
+class ModelFit:
+	"""Fitted mixed model loaded from the artifact cache, see `cached_model_fit`.
+
+	The attributes have the same names as the ones of `MixedLMResults`, so that a stored fit can be used in place of
+	the fitted model to plot or report its results.
+	"""
+
+	def __init__(self, params: pd.DataFrame, random_effects: pd.DataFrame, info: pd.DataFrame):
+		self.params = params["params"]
+		self.bse = params["bse"]
+		self.pvalues = params["pvalues"]
+		self.fe_params = self.params[params["is_fe"]]
+		self.bse_fe = self.bse[params["is_fe"]]
+		self.random_effects = {group: row for group, row in random_effects.iterrows()}
+		self.method = info["method"].iloc[0]
+		self.converged = bool(info["converged"].iloc[0])
+		self.scale = float(info["scale"].iloc[0])
+		self.llf = float(info["llf"].iloc[0])
+		self.nobs = int(info["nobs"].iloc[0])
+
+
+def _bootstrap_batch(
+	stats: dict, group_products: dict, reml: bool, size: int, seed: np.random.SeedSequence
+) -> npt.NDArray[np.float64]:
+	# Fixed effects fitted on `size` resamples of the groups. A resample is the number of copies of each group, and
+	# the sums of the likelihood are weighted by these copies instead of copying the rows.
+	rng = np.random.default_rng(seed)
+	n_groups = len(stats["counts"])
+	fe_params = np.empty((size, stats["xx"].shape[0]))
+	for i, copies in enumerate(rng.multinomial(n_groups, np.full(n_groups, 1 / n_groups), size=size).astype(np.float64)):
+		resample = dict(
+			stats,
+			copies=copies,
+			xx=np.tensordot(copies, group_products["xx"], axes=1),
+			xy=copies @ group_products["xy"],
+			yy=copies @ group_products["yy"],
+		)
+		ratio, _ = _fit_ratio(resample, reml)
+		fe_params[i] = _profile(resample, ratio)[0]
+	return fe_params
+
+
+def bootstrap_fixed_effects(
+	formula: str,
+	data: pd.DataFrame,
+	groups: str,
+	n_bootstraps: int = 1000,
+	reml: bool = True,
+	seed: int = 0,
+	n_workers: int = 1,
+	batch_size: int = 50,
+) -> pd.DataFrame:
+	"""Fit a random intercept model on resamples of its groups (cluster bootstrap).
+
+	The groups (e.g. the targets) are resampled with replacement, keeping all the rows of each drawn group, and the
+	model is fitted on each resample with `fit_random_intercept`. The sums of each group are computed once, so
+	a resample costs a one-dimensional optimization over the groups, whatever the number of rows. The batches of
+	resamples get independent random streams spawned from `seed`, so that the results do not depend on `n_workers`.
+
+	Args:
+		formula (str): the formula of the fixed effects
+		data (pd.DataFrame): the data
+		groups (str): the column of `data` containing the groups
+		n_bootstraps (int): the number of resamples
+		reml (bool): whether to maximize the restricted likelihood (REML) instead of the likelihood (ML)
+		seed (int): the seed of the random number generator
+		n_workers (int): the number of processes used to run the batches, 1 runs them in the current process
+		batch_size (int): the number of resamples of a batch
+
+	Returns:
+		pd.DataFrame: the fixed effects fitted on each resample, one row per resample
+	"""
+	design = smf.ols(formula, data=data, missing="raise")
+	exog = np.asarray(design.exog, dtype=np.float64)
+	endog = np.asarray(design.endog, dtype=np.float64)
+	codes, labels = pd.factorize(data[groups].to_numpy(), sort=True)
+	stats = _group_statistics(endog, exog, codes.astype(np.int64), len(labels))
+
+	# Cross products of each group, the cross products of a resample are their weighted sums
+	indicator = sparse.csr_matrix((np.ones(len(codes)), (codes, np.arange(len(codes)))), shape=(len(labels), len(codes)))
+	group_products = dict(
+		xx=(indicator @ (exog[:, :, None] * exog[:, None, :]).reshape(len(exog), -1)).reshape(len(labels), *stats["xx"].shape),
+		xy=indicator @ (exog * endog[:, None]),
+		yy=indicator @ endog**2,
+	)
+
+	sizes = [min(batch_size, n_bootstraps - start) for start in range(0, n_bootstraps, batch_size)]
+	seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+	fe_params = np.vstack(run_batches(_bootstrap_batch, sizes, seeds, n_workers, stats, group_products, reml))
+	return pd.DataFrame(fe_params, columns=design.exog_names)
+
+
+def summarize_bootstrap(
+	estimate: pd.Series, resampled: pd.DataFrame, contrasts: pd.DataFrame, confidence: float = 0.95
+) -> pd.DataFrame:
+	"""Estimate linear combinations of the fixed effects of a model, with their bootstrap distribution.
+
+	Args:
+		estimate (pd.Series): the fixed effects fitted on the full data
+		resampled (pd.DataFrame): the fixed effects fitted on each resample, see `bootstrap_fixed_effects`
+		contrasts (pd.DataFrame): one row per estimated combination, with the weight of each fixed effect as columns
+		                          (missing fixed effects have a weight of 0)
+		confidence (float): the level of the (percentile) confidence intervals
+
+	Raises:
+		KeyError: if a column of `contrasts` is not a fixed effect of the model
+
+	Returns:
+		pd.DataFrame: one row per contrast, with the columns `estimate` (on the full data), `bse` (the standard
+		deviation of the resampled estimates), `ci_low` and `ci_high`
+	"""
+	unknown = contrasts.columns.difference(resampled.columns)
+	if len(unknown):
+		raise KeyError(f"The contrasts use terms that are not in the model: {list(unknown)}")
+	weights = contrasts.reindex(columns=resampled.columns, fill_value=0.0).to_numpy(dtype=np.float64)
+
+	draws = resampled.to_numpy(dtype=np.float64) @ weights.T
+	ci_low, ci_high = np.quantile(draws, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0)
+	return pd.DataFrame(
+		dict(
+			estimate=weights @ estimate[resampled.columns].to_numpy(dtype=np.float64),
+			bse=draws.std(axis=0, ddof=1),
+			ci_low=ci_low,
+			ci_high=ci_high,
+		),
+		index=contrasts.index,
+	)
+
+
+def cluster_bootstrap(
+	formula: str,
+	data: pd.DataFrame,
+	groups: str,
+	contrasts: pd.DataFrame,
+	n_bootstraps: int = 1000,
+	confidence: float = 0.95,
+	reml: bool = True,
+	seed: int = 0,
+	n_workers: int = 1,
+	batch_size: int = 50,
+) -> pd.DataFrame:
+	"""Estimate linear combinations of the fixed effects of a random intercept model, with a cluster bootstrap.
+
+	The fit on the full data and the resampled fixed effects are loaded from the artifact cache (see
+	`cached_model_fit` and `cached_bootstrap_fixed_effects`), and the contrasts are applied to them afterwards, so that
+	estimating other contrasts of the same model does not resample it again.
+
+	Args:
+		formula (str): the formula of the fixed effects
+		data (pd.DataFrame): the data, it should only contain the columns used by the model, since it is hashed entirely
+		groups (str): the column of `data` containing the groups
+		contrasts (pd.DataFrame): one row per estimated combination, with the weight of each fixed effect as columns
+		                          (missing fixed effects have a weight of 0)
+		n_bootstraps (int): the number of resamples
+		confidence (float): the level of the (percentile) confidence intervals
+		reml (bool): whether to maximize the restricted likelihood (REML) instead of the likelihood (ML)
+		seed (int): the seed of the random number generator
+		n_workers (int): the number of processes used to fit the resamples, 1 fits them in the current process
+		batch_size (int): the number of resamples of a batch
+
+	Raises:
+		KeyError: if a column of `contrasts` is not a fixed effect of the model
+
+	Returns:
+		pd.DataFrame: one row per contrast, see `summarize_bootstrap`
+	"""
+	estimate = cached_model_fit(formula, data, groups, "random_intercept", reml).fe_params
+	resampled = cached_bootstrap_fixed_effects(formula, data, groups, n_bootstraps, reml, seed, n_workers, batch_size)
+	return summarize_bootstrap(estimate, resampled, contrasts, confidence)
+
+
+def fit_mixed_model(
+	formula: str, data: pd.DataFrame, groups: str, estimator: str = "random_intercept", reml: bool = True
+) -> MixedLMResults | RandomInterceptResults:
+	"""Fit a linear model with a random intercept per group.
+
+	Args:
+		formula (str): the formula of the fixed effects
+		data (pd.DataFrame): the data
+		groups (str): the column of `data` containing the groups
+		estimator (str): "statsmodels" fits the model with `MixedLM`, "random_intercept" with `fit_random_intercept`,
+		                 which gives the same fixed effects, standard errors and random effects much faster
+		reml (bool): whether to maximize the restricted likelihood (REML) instead of the likelihood (ML)
+
+	Returns:
+		MixedLMResults | RandomInterceptResults: the results of the fit
+	"""
+	if estimator == "random_intercept":
+		return random_intercept_from_formula(formula, data, groups, reml=reml)
+	if estimator == "statsmodels":
+		return smf.mixedlm(formula, data=data, groups=data[groups]).fit(reml=reml)
+	raise ValueError(f"Unknown estimator '{estimator}'.")
+
+
+def cached_model_fit(
+	formula: str, data: pd.DataFrame, groups: str, estimator: str = "random_intercept", reml: bool = True
+) -> ModelFit:
+	"""Load the results of `fit_mixed_model` from the artifact cache, fitting the model first if it is not there.
+
+	The fit is identified by the formula, the content of `data` and the options of the estimator, so all the
+	consumers of the same model, in the same run or in later runs, share a single fit. `data` should only contain the
+	columns used by the model, since it is hashed entirely.
+
+	Args:
+		formula (str): the formula of the fixed effects
+		data (pd.DataFrame): the data
+		groups (str): the column of `data` containing the groups
+		estimator (str): the estimator, see `fit_mixed_model`
+		reml (bool): whether to maximize the restricted likelihood (REML) instead of the likelihood (ML)
+
+	Returns:
+		ModelFit: the parameters, standard errors, p-values, random effects and convergence information of the fit
+	"""
+	key = artifact_key(formula, data, groups, estimator, reml, MODEL_FIT_VERSION)
+
+	# The tables of a fit are stored separately, the model is fitted at most once for all of them
+	fitted = {}
+
+	def fit() -> MixedLMResults | RandomInterceptResults:
+		if "result" not in fitted:
+			fitted["result"] = fit_mixed_model(formula, data, groups, estimator, reml)
+		return fitted["result"]
+
+	def params_table() -> pd.DataFrame:
+		result = fit()
+		params = pd.DataFrame(dict(params=result.params, bse=result.bse, pvalues=result.pvalues))
+		params["is_fe"] = params.index.isin(result.fe_params.index)
+		return params
+
+	def random_effects_table() -> pd.DataFrame:
+		return pd.DataFrame.from_dict(fit().random_effects, orient="index")
+
+	def info_table() -> pd.DataFrame:
+		result = fit()
+		return pd.DataFrame(
+			dict(method=[result.method], converged=[result.converged], scale=[result.scale], llf=[result.llf], nobs=[result.nobs])
+		)
+
+	return ModelFit(
+		cached_table("model_params", key, params_table),
+		cached_table("model_random_effects", key, random_effects_table),
+		cached_table("model_info", key, info_table),
+	)
+
+
+def cached_bootstrap_fixed_effects(
+	formula: str,
+	data: pd.DataFrame,
+	groups: str,
+	n_bootstraps: int = 1000,
+	reml: bool = True,
+	seed: int = 0,
+	n_workers: int = 1,
+	batch_size: int = 50,
+) -> pd.DataFrame:
+	"""Load the results of `bootstrap_fixed_effects` from the artifact cache, running the bootstrap first if they are not there.
+
+	The results are identified by the formula, the content of `data` and the parameters of the bootstrap (except
+	`n_workers`, which does not change the results). `data` should only contain the columns used by the model, since
+	it is hashed entirely.
+	"""
+	key = artifact_key(formula, data, groups, n_bootstraps, reml, seed, batch_size, MODEL_FIT_VERSION)
+	return cached_table(
+		"model_bootstrap_fixed_effects",
+		key,
+		lambda: bootstrap_fixed_effects(formula, data, groups, n_bootstraps, reml, seed, n_workers, batch_size),
+	)
@@ -1,16 +1,138 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from functools import cache
 
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import statsmodels.formula.api as smf
-from scipy.stats import zscore
-from statsmodels.regression.mixed_linear_model import MixedLMResults
+from scipy.stats import chi2, zscore
+from statsmodels.regression.mixed_linear_model import MixedLM, MixedLMResults
 
+from src.utils import logger
 from src.utils.data import load_graph_data
+from src.utils.data.paths import BACKTRACK, PathArrays
+from src.utils.grouped_stats import segment_ids
 from src.utils.metrics import pagerank
-from src.utils.strategies.backtrack_strategy import compute_backtrack_ratio
-from src.utils.strategies.hub_focused_strategy import compute_hub_usage_ratio
-from src.utils.strategies.link_strategy import get_click_positions, get_probability_link, top_link_ratio
-from src.utils.strategies.semantic_strategy import semantic_increase_score
+from src.utils.mixed_models import (
+	ModelFit,
+	RandomInterceptResults,
+	cached_bootstrap_fixed_effects,
+	cached_model_fit,
+	fit_mixed_model,
+	summarize_bootstrap,
+)
+from src.utils.strategies.hub_focused_strategy import get_hub_mask
+from src.utils.strategies.link_strategy import build_link_position_table, build_link_positions
+from src.utils.strategies.semantic_strategy import (
+	get_article_vectors,
+	load_target_similarity_matrix,
+	semantic_increase_scores_from_arrays,
+)
+
+
+# Indexes shared by the processes computing the strategy scores, set once per process by `_init_strategies_worker`
+_worker_indexes = {}
+
+
+def _init_strategies_worker(is_hub: np.ndarray, link_keys: np.ndarray, link_positions: np.ndarray) -> None:
+	_worker_indexes.update(is_hub=is_hub, link_keys=link_keys, link_positions=link_positions)
+
+
+def _strategies_scores_chunk(path_arrays: PathArrays, target_ids: np.ndarray) -> dict[str, np.ndarray]:
+	# All the strategy scores of a chunk of paths, in a single pass over their raw articles
+	is_hub, link_keys, link_positions = (_worker_indexes[k] for k in ["is_hub", "link_keys", "link_positions"])
+	indptr, article_ids = path_arrays.variant("raw")
+	lengths = np.diff(indptr)
+	segments = segment_ids(indptr)
+	is_article = article_ids != BACKTRACK
+
+	# The '<' are counted in the length of the paths, like in `compute_backtrack_ratio` and `compute_hub_usage_ratio`
+	with np.errstate(divide="ignore", invalid="ignore"):
+		backtrack_ratio = np.bincount(segments, weights=~is_article, minlength=len(lengths)) / lengths
+		hub_counts = np.bincount(segments, weights=is_article & is_hub[article_ids], minlength=len(lengths))
+		hub_ratio = np.where(lengths > 0, hub_counts / lengths, 0.0)
+
+	# Clicks between two consecutive articles of the raw path (the steps from or to a '<' are not clicks)
+	is_pair = (segments[1:] == segments[:-1]) & is_article[1:] & is_article[:-1]
+	keys = article_ids[:-1][is_pair] * len(is_hub) + article_ids[1:][is_pair]
+	found = np.minimum(np.searchsorted(link_keys, keys), max(len(link_keys) - 1, 0))
+	positions = np.full(len(keys), np.nan)
+	if len(link_keys):
+		positions = np.where(link_keys[found] == keys, link_positions[found], np.nan)
+	clicks = np.bincount(segments[1:][is_pair], weights=~np.isnan(positions), minlength=len(lengths))
+	top_clicks = np.bincount(segments[1:][is_pair], weights=positions <= 0.3, minlength=len(lengths))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		top_links_ratio = np.where(clicks > 0, top_clicks / clicks, 0.0)
+
+	return {
+		"semantic_increase_score": semantic_increase_scores_from_arrays(path_arrays, target_ids),
+		"top_links_ratio": top_links_ratio,
+		"backtrack_ratio": backtrack_ratio,
+		"hub_ratio": hub_ratio,
+	}
+
+
+def compute_strategies_scores(path_arrays: PathArrays, target_ids: np.ndarray, n_workers: int = 1) -> pd.DataFrame:
+	"""
+	Compute the strategy scores of many paths at once, possibly in several processes.
+
+	The paths are split in chunks, and all the scores of a chunk are computed in a single pass over its paths. The
+	indexes used by all the chunks (hubs and link positions) are sent once to each process.
+
+	Args:
+	    path_arrays (PathArrays): the paths, encoded with the articles of the TF-IDF matrix (e.g. `paths_finished_arrays`)
+	    target_ids (np.ndarray): the id of the target article of each path
+	    n_workers (int): the number of processes, 1 computes the scores in the current process
+
+	Returns:
+	    pd.DataFrame: the columns 'semantic_increase_score', 'top_links_ratio', 'backtrack_ratio' and 'hub_ratio',
+	              indexed like `path_arrays`
+	"""
+	indexes = (get_hub_mask(path_arrays.articles), *build_link_position_table(path_arrays.articles))
+
+	n_chunks = max(1, min(len(path_arrays), 4 * n_workers))
+	chunks = np.array_split(np.arange(len(path_arrays)), n_chunks)
+	target_ids = np.asarray(target_ids, dtype=np.int64)
+
+	if n_workers <= 1:
+		_init_strategies_worker(*indexes)
+		results = [_strategies_scores_chunk(path_arrays.take(chunk), target_ids[chunk]) for chunk in chunks]
+	else:
+		# Warm the semantic caches, so that forked processes inherit them
+		get_article_vectors()
+		load_target_similarity_matrix()
+		with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_strategies_worker, initargs=indexes) as executor:
+			futures = [executor.submit(_strategies_scores_chunk, path_arrays.take(chunk), target_ids[chunk]) for chunk in chunks]
+			results = [future.result() for future in futures]
+
+	return pd.DataFrame(
+		{name: np.concatenate([result[name] for result in results]) for name in results[0]},
+		index=path_arrays.index,
+	)
+
+
+# Number of processes used by the cached getters of this module, see `set_n_workers`
+_compute_options = {"n_workers": 1}
+
+
+def set_n_workers(n_workers: int | None) -> None:
+	"""
+	Set the number of processes used by the cached getters of this module (e.g. `get_strategies_scores`).
+
+	Their results do not depend on it, so it is not part of their cache keys.
+
+	Args:
+	    n_workers (int): the number of processes (1 by default), None uses the number of CPUs
+	"""
+	_compute_options["n_workers"] = n_workers
+
+
+def _get_n_workers() -> int:
+	n_workers = _compute_options["n_workers"]
+	return n_workers if n_workers is not None else os.cpu_count() or 1
 
 
 @cache
@@ -18,7 +140,8 @@ def get_strategies_scores() -> pd.DataFrame:
 	"""
 	Computes and returns a DataFrame containing various strategy scores for all the finished paths.
 
-	Note that this function will ignore paths that are shorter than two articles, and paths that took more than 15 min to complete
+	Note that this function will ignore paths that are shorter than two articles, and paths that took more than 15 min to complete.
+	The scores are computed with `set_n_workers` processes.
 
 	Returns:
 	    pd.DataFrame: A DataFrame containing the filtered paths and their computed strategy scores.
@@ -30,11 +153,12 @@ def get_strategies_scores() -> pd.DataFrame:
 	paths_scores = paths_scores[paths_scores["path"].apply(len) > 2]  # Remove paths that are too short
 	paths_scores = paths_scores[paths_scores["duration_in_seconds"] < 1000]  # Remove paths that took more than 15 min to finish
 
-	# Compute the strategies scores
-	paths_scores["semantic_increase_score"] = paths_scores["path"].apply(semantic_increase_score)
-	paths_scores["top_links_ratio"] = paths_scores["path"].apply(top_link_ratio)
-	paths_scores["backtrack_ratio"] = paths_scores["path"].apply(compute_backtrack_ratio)
-	paths_scores["hub_ratio"] = paths_scores["path"].apply(compute_hub_usage_ratio)
+	# Compute the strategies scores, the target of each path is its last article
+	path_arrays = graph_data["paths_finished_arrays"].loc(paths_scores.index)
+	target_ids = path_arrays.article_ids([path[-1] for path in paths_scores["path"]])
+	scores = compute_strategies_scores(path_arrays, target_ids, _get_n_workers())
+	for column in scores.columns:
+		paths_scores[column] = scores[column]
 	return paths_scores
 
 
@@ -42,7 +166,7 @@ def get_normalized_strategies_scores() -> pd.DataFrame:
 	"""
 	Same as get_strategies_scores(), but the scores and ratios are normalized using z-score normalization
 	"""
-	paths_scores = get_strategies_scores()
+	paths_scores = get_strategies_scores().copy()
 
 	# Normalize the scores using z-score normalization
 	paths_scores["semantic_increase_score"] = zscore(paths_scores["semantic_increase_score"])
@@ -53,27 +177,80 @@ def get_normalized_strategies_scores() -> pd.DataFrame:
 	return paths_scores
 
 
-def perform_mixed_linear_regression() -> MixedLMResults:
+# Model of the duration of the games explained by the strategy scores, with a random intercept per target
+MIXED_MODEL_FORMULA = "duration_in_seconds ~ semantic_increase_score + top_links_ratio + hub_ratio + backtrack_ratio"
+
+
+def perform_mixed_linear_regression(estimator: str = "statsmodels") -> MixedLMResults | RandomInterceptResults:
 	"""
 	Perform a mixed linear regression on strategy scores.
 
+	Args:
+	    estimator (str): "statsmodels" fits the model with `MixedLM`, "random_intercept" with `fit_random_intercept`,
+	              which gives the same fixed effects, standard errors and random effects much faster
+
 	Returns:
-	    MixedLMResults: The results of the fitted mixed linear model.
+	    MixedLMResults | RandomInterceptResults: The results of the fitted mixed linear model.
 	"""
-	paths_scores = get_strategies_scores()
-	model = smf.mixedlm(
-		"duration_in_seconds ~ semantic_increase_score + top_links_ratio + hub_ratio + backtrack_ratio",
-		data=paths_scores,
-		groups=paths_scores["target"],
-	)
-	return model.fit()
+	return fit_mixed_model(MIXED_MODEL_FORMULA, get_strategies_scores(), "target", estimator)
+
 
+def get_mixed_linear_regression_fit(estimator: str = "random_intercept") -> ModelFit:
+	"""
+	Same as perform_mixed_linear_regression(), but the fit is stored in the artifact cache and shared by all its consumers.
 
-def perform_backward_selection(data: pd.DataFrame) -> MixedLMResults:
+	Returns:
+	    ModelFit: The parameters, standard errors, p-values and random effects of the fitted mixed linear model.
+	"""
+	columns = ["duration_in_seconds", "semantic_increase_score", "top_links_ratio", "hub_ratio", "backtrack_ratio", "target"]
+	return cached_model_fit(MIXED_MODEL_FORMULA, get_strategies_scores()[columns], "target", estimator)
+
+
+# Design of the mixed model shared by the processes fitting the candidate models, set by `_init_selection_worker`
+_worker_design = {}
+
+
+def _init_selection_worker(endog: pd.Series, exog: pd.DataFrame, groups: np.ndarray) -> None:
+	_worker_design.update(endog=endog, exog=exog, groups=groups)
+
+
+def _fit_submodel(columns: list[str], start_params: np.ndarray | None = None, reml: bool = True) -> MixedLMResults:
+	# Fit the mixed model restricted to some columns of the shared design, without parsing any formula
+	exog = _worker_design["exog"][columns]
+	model = MixedLM(_worker_design["endog"], exog, _worker_design["groups"])
+	return model.fit(start_params=start_params, reml=reml)
+
+
+def _lrt_candidate(columns: list[str], start_params: np.ndarray) -> float:
+	# Log-likelihood (ML) of a candidate model of the backward selection
+	return _fit_submodel(columns, start_params, reml=False).llf
+
+
+def perform_backward_selection(
+	data: pd.DataFrame | None = None,
+	threshold: float = 0.0002,
+	criterion: str = "wald",
+	n_workers: int = 1,
+) -> MixedLMResults:
 	"""
 	Runs the backward selection algorithm to select the most important features
+
+	The design matrix of the full model is built once, and the models of each step are fitted on a subset of its
+	columns, starting from the variance parameters of the previous fit.
+
+	Args:
+	    data (pd.DataFrame): the strategy scores, defaults to `get_strategies_scores()`
+	    threshold (float): the p-value under which all the remaining terms are kept
+	    criterion (str): "wald" removes the term with the highest p-value in the current fit, "lrt" removes the term
+	              whose removal has the highest likelihood ratio test p-value (the models are then compared with ML fits)
+	    n_workers (int): the number of processes fitting the candidate models of a step, only used with "lrt"
+
+	Returns:
+	    MixedLMResults: The (REML) results of the selected model.
 	"""
-	paths_scores = get_strategies_scores()
+	if criterion not in ("wald", "lrt"):
+		raise ValueError(f"Unknown selection criterion '{criterion}'.")
+	paths_scores = get_strategies_scores() if data is None else data
 
 	terms = [
 		"semantic_increase_score",
@@ -93,103 +270,332 @@ def perform_backward_selection(data: pd.DataFrame) -> MixedLMResults:
 		"semantic_increase_score:top_links_ratio:hub_ratio:backtrack_ratio",
 	]
 
-	while True:
-		formula = f"duration_in_seconds ~ {' + '.join(terms)}"
-		model = smf.mixedlm(formula, data=paths_scores, groups=paths_scores["target"])
-		result = model.fit()
-  
-		worst_feature = result.pvalues.iloc[1:-1].idxmax()  # Exclude the Intercept and Group Var
-		max_pvalue = result.pvalues.max()
+	# Build the design matrix of the full model once, the models of each step use a subset of its columns.
+	# All the terms are products of continuous scores, so each term is exactly one column of the design.
+	full_model = smf.mixedlm(f"duration_in_seconds ~ {' + '.join(terms)}", data=paths_scores, groups=paths_scores["target"])
+	terms = [term for term in full_model.exog_names if term != "Intercept"]
+	design = (
+		pd.Series(full_model.endog, name=full_model.endog_names),
+		pd.DataFrame(full_model.exog, columns=full_model.exog_names),
+		full_model.groups,
+	)
+	_init_selection_worker(*design)
+
+	executor = None
+	if criterion == "lrt" and n_workers > 1:
+		executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_selection_worker, initargs=design)
+
+	try:
+		result = _fit_submodel(["Intercept", *terms], reml=criterion == "wald")
+		for step in itertools.count(1):
+			start_time = time.perf_counter()
+			# Variance parameters of the current fit, used as a starting point by the next fits
+			start_params = result.params_object.get_packed(use_sqrt=True, has_fe=False)
+
+			if criterion == "wald":
+				worst_feature = result.pvalues.iloc[1:-1].idxmax()  # Exclude the Intercept and Group Var
+				max_pvalue = result.pvalues.max()
+				n_fits = 0
+			else:
+				candidates = [[other for other in terms if other != term] for term in terms]
+				if executor is None:
+					llfs = [_lrt_candidate(["Intercept", *candidate], start_params) for candidate in candidates]
+				else:
+					futures = [executor.submit(_lrt_candidate, ["Intercept", *candidate], start_params) for candidate in candidates]
+					llfs = [future.result() for future in futures]
+				pvalues = chi2.sf(2 * (result.llf - np.asarray(llfs)), 1)
+				worst_feature, max_pvalue = terms[np.argmax(pvalues)], pvalues.max()
+				n_fits = len(candidates)
+
+			if len(terms) <= 1 or max_pvalue < threshold:
+				logger.info(f"backward selection step {step}: stopped with {len(terms)} terms ({time.perf_counter() - start_time:.2f}s)")
+				break
+
+			logger.info(f"Removing '{worst_feature}' with p-value {max_pvalue}")
+			terms.remove(worst_feature)
+			result = _fit_submodel(["Intercept", *terms], start_params, reml=criterion == "wald")
+			logger.info(
+				f"backward selection step {step}: {len(terms)} terms left, {n_fits + 1} fits in {time.perf_counter() - start_time:.2f}s"
+			)
+	finally:
+		if executor is not None:
+			executor.shutdown()
+
+	if criterion == "lrt":
+		result = _fit_submodel(["Intercept", *terms], result.params_object.get_packed(use_sqrt=True, has_fe=False))
+	return result
+
 
-		if len(terms) <= 1 or max_pvalue < 0.0002:
-			break
+# Terms of the model selected by `perform_backward_selection` on the normalized strategy scores (see results.ipynb)
+SELECTED_MODEL_TERMS = [
+	"semantic_increase_score",
+	"top_links_ratio",
+	"hub_ratio",
+	"backtrack_ratio",
+	"semantic_increase_score:hub_ratio",
+	"semantic_increase_score:backtrack_ratio",
+	"top_links_ratio:hub_ratio",
+	"hub_ratio:backtrack_ratio",
+	"semantic_increase_score:hub_ratio:backtrack_ratio",
+]
 
-		print(f"Removing '{worst_feature}' with p-value {max_pvalue}")
-		terms.remove(worst_feature)
 
-	return result
+def strategy_combination_contrasts(combinations: dict[str, list[str]]) -> pd.DataFrame:
+	"""
+	Build the contrasts of the selected model giving the expected duration of a game for combinations of strategies.
 
+	A strategy is used when its normalized score is 1 (one standard deviation above the mean) and unused when it is 0
+	(the mean), so each term of the model is 1 if all its scores are used and 0 otherwise.
 
-def build_comparison_df(
-	graph_data, top_hubs=200, threshold_semantic=0.8, threshold_link=0.8, threshold_backtrack=0.1, threshold_hub=0.8
-):
+	Args:
+	    combinations (dict[str, list[str]]): the scores used by each combination, e.g. {"Semantic only": ["semantic_increase_score"]}
+
+	Returns:
+	    pd.DataFrame: one row per combination, with the weight of each fixed effect of the model as columns
+	"""
+	return pd.DataFrame.from_dict(
+		{
+			name: {"Intercept": 1.0, **{term: float(set(term.split(":")) <= set(used)) for term in SELECTED_MODEL_TERMS}}
+			for name, used in combinations.items()
+		},
+		orient="index",
+	)
+
+
+@cache
+def _selected_model_bootstrap(n_bootstraps: int, seed: int) -> tuple[pd.Series, pd.DataFrame]:
+	columns = ["duration_in_seconds", "semantic_increase_score", "top_links_ratio", "hub_ratio", "backtrack_ratio", "target"]
+	formula = f"duration_in_seconds ~ {' + '.join(SELECTED_MODEL_TERMS)}"
+	data = get_normalized_strategies_scores()[columns]
+	return (
+		cached_model_fit(formula, data, "target").fe_params,
+		cached_bootstrap_fixed_effects(formula, data, "target", n_bootstraps, seed=seed, n_workers=_get_n_workers()),
+	)
+
+
+def get_selected_model_bootstrap(n_bootstraps: int = 1000, seed: int = 0) -> tuple[pd.Series, pd.DataFrame]:
+	"""
+	Fit the selected model on the normalized strategy scores, and on resamples of the targets (cluster bootstrap).
+
+	The fits are stored in the artifact cache, so they are only computed again when the scores change, and kept in
+	memory. The resamples are fitted with `set_n_workers` processes.
+
+	Args:
+	    n_bootstraps (int): the number of resamples of the targets
+	    seed (int): the seed of the random number generator
+
+	Returns:
+	    tuple[pd.Series, pd.DataFrame]: the fixed effects fitted on all the paths, and on each resample (one row per
+	              resample), see `summarize_bootstrap`
+	"""
+	# The arguments are always passed in the same way, so that the cached results are shared by all the callers
+	return _selected_model_bootstrap(n_bootstraps, seed)
+
+
+def bootstrap_selected_model(contrasts: pd.DataFrame, n_bootstraps: int = 1000, seed: int = 0) -> pd.DataFrame:
+	"""
+	Estimate combinations of the effects of the selected model, with a bootstrap over the targets.
+
+	The model is fitted and resampled once by `get_selected_model_bootstrap`, whatever the contrasts.
+
+	Args:
+	    contrasts (pd.DataFrame): one row per estimated combination, with the weight of each term as columns
+	              (e.g. `strategy_combination_contrasts`)
+	    n_bootstraps (int): the number of resamples of the targets
+	    seed (int): the seed of the random number generator
+
+	Returns:
+	    pd.DataFrame: one row per contrast, with the columns 'estimate', 'bse', 'ci_low' and 'ci_high' (95% intervals)
+	"""
+	return summarize_bootstrap(*get_selected_model_bootstrap(n_bootstraps, seed), contrasts)
+
+
+# Continuous score behind each strategy flag of `build_comparison_df`
+STRATEGY_SCORES = {
+	"top_link_usage": "link_percentage",
+	"semantic": "semantic_increase_score",
+	"hub_usage": "hub_usage_ratio",
+	"backtrack": "backtrack_ratio",
+}
+
+
+def compute_comparison_scores(graph_data, top_hubs=200) -> tuple[pd.DataFrame, pd.DataFrame]:
+	"""
+	Compute the continuous strategy scores of the finished and unfinished paths, before any threshold is applied.
+
+	The '<' are removed from the paths, but the articles that the person attempted to go to are kept. All the scores
+	are computed at once on the precomputed paths of `graph_data` (finished and unfinished together), which is not
+	modified. Paths with less than 4 or more than 100 articles, paths that progressively get further from the target
+	(negative SIS) and unfinished paths whose target has no text are ignored.
+
+	Returns:
+	    tuple[pd.DataFrame, pd.DataFrame]: the scores of the finished and unfinished paths, with the columns 'source',
+	              'target', 'path', 'time', 'finished', 'link_percentage', 'num_clicks', 'semantic_increase_score',
+	              'max_generality' (whether the path goes through one of the `top_hubs` most general articles),
+	              'hub_usage_ratio' and 'backtrack_ratio'
+	"""
 	graph_pagerank = pagerank(graph_data["graph"])
 	article_gen_score = graph_pagerank.set_index("Article")["Generality_score"]
 	sorted_scores = article_gen_score.sort_values(ascending=False)
 	score_threshold = sorted_scores.iloc[top_hubs]
 
-	article_gen_score = graph_pagerank.set_index("Article")["Generality_score"]
-
-	# Remove < from path (but keep the articles that the person attempted to go to)
-	graph_data["paths_finished"]["backtrack_ratio"] = graph_data["paths_finished"]["path"].apply(compute_backtrack_ratio)
-	graph_data["paths_unfinished"]["backtrack_ratio"] = graph_data["paths_unfinished"]["path"].apply(compute_backtrack_ratio)
-	graph_data["paths_finished"]["path_clean"] = graph_data["paths_finished"]["path"].apply(lambda x: [u for u in x if u != "<"])
-	graph_data["paths_unfinished"]["path_clean"] = graph_data["paths_finished"]["path"].apply(
-		lambda x: [u for u in x if u != "<"]
+	games = pd.concat(
+		[
+			graph_data["paths_finished"][["source", "target", "duration_in_seconds"]].assign(finished=True),
+			graph_data["paths_unfinished"][["source", "target", "duration_in_seconds"]].assign(finished=False),
+		],
+		ignore_index=True,
 	)
+	path_arrays = PathArrays.concat([graph_data["paths_finished_arrays"], graph_data["paths_unfinished_arrays"]])
+	articles = path_arrays.articles
+
+	indptr, article_ids = path_arrays.variant("dropped")
+	num_clicks = np.diff(indptr)
+	segments = segment_ids(indptr)
+	nonempty = num_clicks > 0
+
+	# Top link usage: ratio of the clicks (with a known link position) that are on a top link
+	has_next = np.ones(len(article_ids), dtype=bool)
+	has_next[indptr[1:][nonempty] - 1] = False
+	next_ids = article_ids[np.flatnonzero(has_next) + 1]
+	clicked_links = pd.MultiIndex.from_arrays([articles[article_ids[has_next]], articles[next_ids]])
+	link_positions = build_link_positions().reindex(clicked_links)
+	clicks = np.bincount(segments[has_next], weights=link_positions.notna().to_numpy(), minlength=len(games))
+	top_clicks = np.bincount(segments[has_next], weights=(link_positions <= 0.3).to_numpy(), minlength=len(games))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		link_percentage = np.where(clicks > 0, top_clicks / clicks, 0.0)
+
+	# Highest generality score along the path
+	generality = article_gen_score.reindex(articles).to_numpy(dtype=np.float64)[article_ids]
+	max_gen = np.full(len(games), np.nan)
+	max_gen[nonempty] = np.fmax.reduceat(generality, indptr[:-1][nonempty]) if nonempty.any() else []
+
+	# Hub usage ratio: ratio of the articles of the path that are one of the top 200 hubs
+	is_hub = get_hub_mask(articles)
+	hub_counts = np.bincount(segments, weights=is_hub[article_ids], minlength=len(games))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		hub_usage_ratio = np.where(nonempty, hub_counts / num_clicks, 0.0)
+
+	backtrack_ratio = path_arrays.backtrack_counts / path_arrays.lengths("raw")
+
+	# SIS of the cleaned paths with their target, the targets without text cannot be scored
+	target_ids = path_arrays.article_ids(games["target"])
+	unknown_targets = target_ids < 0
+	if unknown_targets.any():
+		logger.warning(f"{games['target'][unknown_targets].nunique()} targets were not found in the list of documents")
+	semantic = np.full(len(games), np.nan)
+	known = np.flatnonzero(~unknown_targets)
+	known_paths = path_arrays.take(known).without_backtracks("dropped")
+	semantic[known] = semantic_increase_scores_from_arrays(known_paths, target_ids[known])
+
+	# A path too short, too long, or that progressively gets further from target doesn't make sense and will be ignored
+	keep = ~unknown_targets & (num_clicks >= 4) & (num_clicks <= 100) & ~(semantic < 0)
+	scores = pd.DataFrame(
+		{
+			"source": games["source"],
+			"target": games["target"],
+			"path": path_arrays.to_lists("dropped"),
+			"time": games["duration_in_seconds"],
+			"finished": games["finished"],
+			"link_percentage": link_percentage,
+			"num_clicks": num_clicks,
+			"semantic_increase_score": semantic,
+			"max_generality": max_gen > score_threshold,
+			"hub_usage_ratio": hub_usage_ratio,
+			"backtrack_ratio": backtrack_ratio,
+		}
+	)[keep]
+
+	finished = scores[scores["finished"]].reset_index(drop=True)
+	unfinished = scores[~scores["finished"]].reset_index(drop=True)
+
+	return finished, unfinished
+
 
-	fin_list = []
-
-	for _, row in graph_data["paths_finished"].iterrows():
-		path = row["path_clean"]
-		time = row["duration_in_seconds"]
-		click_positions = get_click_positions(pd.DataFrame({"path": [path]}))
-		prob = get_probability_link(click_positions)
-		semantic = semantic_increase_score(path, row["target"])
-		max_gen = article_gen_score.loc[path].max()
-		if len(path) < 4 or semantic < 0 or len(path) > 100:
-			continue  # A path too short, too long, or that progressively gets further from target doesn't make sense and will be ignored
-		fin_list.append(
-			{
-				"source": row["source"],
-				"target": row["target"],
-				"path": path,
-				"time": time,
-				"finished": True,
-				"link_percentage": prob,
-				"num_clicks": len(path),
-				"top_link_usage": prob > threshold_link,
-				"semantic": semantic > threshold_semantic,
-				"max_generality": max_gen > score_threshold,
-				"hub_usage": compute_hub_usage_ratio(path) > threshold_hub,
-				"backtrack": row["backtrack_ratio"] > threshold_backtrack,
-			}
-		)
-
-	finished = pd.DataFrame(fin_list)
-
-	unfin_list = []
-	for _, row in graph_data["paths_unfinished"].iterrows():
-		path = row["path_clean"]
-		time = row["duration_in_seconds"]
-		click_positions = get_click_positions(pd.DataFrame({"path": [path]}))
-		prob = get_probability_link(click_positions)
-		try:
-			semantic = semantic_increase_score(path, row["target"])
-		except KeyError:
-			print(f"Warning: {row['target']} was not found in the list of documents")
+def build_comparison_df(
+	graph_data, top_hubs=200, threshold_semantic=0.8, threshold_link=0.8, threshold_backtrack=0.1, threshold_hub=0.8
+):
+	thresholds = {
+		"top_link_usage": threshold_link,
+		"semantic": threshold_semantic,
+		"hub_usage": threshold_hub,
+		"backtrack": threshold_backtrack,
+	}
+
+	result = []
+	for scores in compute_comparison_scores(graph_data, top_hubs):
+		if scores.empty:
+			result.append(pd.DataFrame())
 			continue
 
-		max_gen = article_gen_score.loc[path].max()
-		if len(path) < 4 or semantic < 0 or len(path) > 100:
-			continue  # A path too short, too long, or that progressively gets further from target doesn't make sense and will be ignored
-
-		unfin_list.append(
-			{
-				"source": row["source"],
-				"target": row["target"],
-				"path": path,
-				"time": time,
-				"finished": False,
-				"num_clicks": len(path),
-				"top_link_usage": prob > threshold_link,
-				"semantic": semantic > threshold_semantic,
-				"max_generality": max_gen > score_threshold,
-				"hub_usage": compute_hub_usage_ratio(path) > threshold_hub,
-				"backtrack": row["backtrack_ratio"] > threshold_backtrack,
-			}
-		)
-
-	unfinished = pd.DataFrame(unfin_list)
+		df = scores[["source", "target", "path", "time", "finished", "link_percentage", "num_clicks"]].copy()
+		for flag in ["top_link_usage", "semantic", "max_generality", "hub_usage", "backtrack"]:
+			df[flag] = scores[flag] if flag == "max_generality" else scores[STRATEGY_SCORES[flag]] > thresholds[flag]
+		result.append(df)
+
+	finished, unfinished = result
+	# The link percentage is only kept for the finished paths
+	unfinished = unfinished.drop(columns="link_percentage", errors="ignore")
 
 	return finished, unfinished
+
+
+def sweep_strategy_thresholds(
+	finished: pd.DataFrame, unfinished: pd.DataFrame, thresholds: dict[str, npt.ArrayLike] | None = None
+) -> pd.DataFrame:
+	"""
+	Evaluate the strategy flags of `build_comparison_df` for a grid of thresholds at once.
+
+	Each score is sorted once, and the games whose score is above each threshold are found with `searchsorted`. The
+	success rate and mean time of these games are then read from prefix sums.
+
+	Args:
+	    finished (pd.DataFrame): the scores of the finished paths, as returned by `compute_comparison_scores`
+	    unfinished (pd.DataFrame): the scores of the unfinished paths, as returned by `compute_comparison_scores`
+	    thresholds (dict): the thresholds to evaluate for each flag of `STRATEGY_SCORES`, 21 values between 0 and 1 by default
+
+	Returns:
+	    pd.DataFrame: one row per flag and threshold, with the columns 'strategy', 'score', 'threshold', 'num_games'
+	              (games with a score above the threshold), 'success_rate' (finished ratio of these games), 'num_finished'
+	              and 'mean_time' (mean time of the finished ones). Empty selections have a NaN rate and time.
+	"""
+	if thresholds is None:
+		thresholds = {flag: np.linspace(0, 1, 21) for flag in STRATEGY_SCORES}
+
+	all_paths = pd.concat([finished, unfinished], ignore_index=True)
+	is_finished = all_paths["finished"].to_numpy(dtype=bool)
+	times = np.where(is_finished, all_paths["time"].to_numpy(dtype=np.float64), 0.0)
+
+	rows = []
+	for flag, grid in thresholds.items():
+		score = STRATEGY_SCORES[flag]
+		grid = np.asarray(grid, dtype=np.float64)
+		values = all_paths[score].to_numpy(dtype=np.float64)
+		# Like the flags of `build_comparison_df`, a NaN score is never above a threshold, so it is left out of the sort
+		known = np.flatnonzero(~np.isnan(values))
+		order = known[np.argsort(values[known], kind="stable")]
+
+		# Suffix sums over the games sorted by score, with a trailing 0 for the empty suffix
+		finished_counts = np.append(np.cumsum(is_finished[order][::-1])[::-1], 0)
+		time_sums = np.append(np.cumsum(times[order][::-1])[::-1], 0)
+
+		# The flags are strict: a game is selected if its score is strictly above the threshold
+		first_above = np.searchsorted(values[order], grid, side="right")
+		num_games = len(order) - first_above
+		num_finished = finished_counts[first_above]
+		with np.errstate(divide="ignore", invalid="ignore"):
+			rows.append(
+				pd.DataFrame(
+					{
+						"strategy": flag,
+						"score": score,
+						"threshold": grid,
+						"num_games": num_games,
+						"success_rate": num_finished / num_games,
+						"num_finished": num_finished,
+						"mean_time": time_sums[first_above] / num_finished,
+					}
+				)
+			)
+
+	return pd.concat(rows, ignore_index=True)
@@ -1,4 +1,49 @@
+from collections.abc import Sequence
+from functools import cache
+
+import numpy as np
+import numpy.typing as npt
+
 from src.utils.data import load_graph_data
+from src.utils.data.paths import BACKTRACK, PathArrays
+from src.utils.grouped_stats import segment_ids
+
+
+@cache
+def get_top_hubs() -> frozenset[str]:
+    """
+    Return the names of the top 200 hubs by PageRank score.
+    """
+    graph_data = load_graph_data()
+    return frozenset(article for article, score in graph_data['top_200_hubs'])
+
+
+@cache
+def _get_graph_hub_mask() -> npt.NDArray[np.bool_]:
+    articles = load_graph_data()["articles"]["name"].to_numpy()
+    return np.isin(articles, list(get_top_hubs()))
+
+
+def get_hub_mask(articles: Sequence[str] | None = None) -> npt.NDArray[np.bool_]:
+    """
+    Return a boolean mask telling, for each article id, whether the article is one of the top 200 hubs.
+
+    Args:
+        articles (Sequence[str]): the article names defining the ids (e.g. `path_arrays.articles`). If None, the
+                                  articles of `load_graph_data`, which are also the ids of `paths_finished_arrays`
+
+    Returns:
+        np.ndarray: the mask, of length `len(articles)`. It is shared by all the callers and must not be modified
+    """
+    mask = _get_graph_hub_mask()
+    if articles is None:
+        return mask
+
+    graph_articles = load_graph_data()["articles"]["name"].to_numpy()
+    if articles is graph_articles or (len(articles) == len(graph_articles) and np.array_equal(articles, graph_articles)):
+        return mask
+    return np.isin(np.asarray(articles, dtype=object), list(get_top_hubs()))
+
 
 def compute_hub_usage_ratio(path: list[str]) -> float:
     """
@@ -10,10 +55,38 @@ def compute_hub_usage_ratio(path: list[str]) -> float:
     Returns:
         float: Ratio of hub articles in the path.
     """
-    graph_data = load_graph_data()
-    top_hubs = {article for article, score in graph_data['top_200_hubs']}
-    
-	# Return hub usage ratio
+    top_hubs = get_top_hubs()
+
+    # Return hub usage ratio
     # This assumes path of length 1 are removed from the dataset
     hub_count = sum(1 for article in path if article in top_hubs)
     return hub_count / len(path) if path else 0.0
+
+
+def hub_usage_ratio(paths: Sequence[list[str]] | PathArrays) -> npt.NDArray[np.float64]:
+    """
+    Compute the hub usage ratio of many paths at once, with a single lookup in the hub mask and one sum per path.
+
+    The ratios are the same as calling `compute_hub_usage_ratio` on every path: the '<' are counted in the length
+    of the paths, and empty paths have a ratio of 0.
+
+    Args:
+        paths (Sequence[list[str]] | PathArrays): the paths, as lists of article names or already encoded
+                                                  (e.g. `paths_finished_arrays`)
+
+    Raises:
+        KeyError: if a path given as a list contains an article that is not in the graph data
+
+    Returns:
+        np.ndarray: the hub usage ratio of each path
+    """
+    if not isinstance(paths, PathArrays):
+        paths = PathArrays.from_paths(paths, load_graph_data()["articles"]["name"])
+
+    indptr, article_ids = paths.variant("raw")
+    lengths = np.diff(indptr)
+    is_hub = get_hub_mask(paths.articles)[article_ids] & (article_ids != BACKTRACK)
+    hub_counts = np.bincount(segment_ids(indptr), weights=is_hub, minlength=len(lengths))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(lengths > 0, hub_counts / lengths, 0.0)
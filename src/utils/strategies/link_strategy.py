@@ -1,5 +1,6 @@
 from functools import cache
 
+import numpy as np
 import pandas as pd
 
 from src.utils.data import get_links_from_html_files
@@ -18,6 +19,48 @@ def build_link_order():
 	return all_links_dict
 
 
+@cache
+def build_link_positions() -> pd.Series:
+	"""
+	Return the relative position of the link clicked to go from an article to another one
+
+	Like in `get_click_positions`, only the first link to an article is considered, and it is NaN if
+	that link has no position. The series is indexed by (article, title of the link)
+	"""
+	all_links_dict = build_link_order()
+	links = pd.DataFrame(
+		[
+			(article, link.get("title"), link.get("position", np.nan))
+			for article, article_links in all_links_dict.items()
+			for link in article_links
+		],
+		columns=["article", "title", "position"],
+	)
+
+	return links.drop_duplicates(["article", "title"], keep="first").set_index(["article", "title"])["position"]
+
+
+def build_link_position_table(articles) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Return the link positions of `build_link_positions` as sorted integer keys, for lookups with `np.searchsorted`
+
+	The key of the link from the article with id `i` to the article with id `j` (ids are positions in `articles`)
+	is `i * len(articles) + j`. Links to or from an article that is not in `articles` are ignored.
+
+	Returns:
+	A tuple (keys, positions) of arrays sorted by key
+	"""
+	link_positions = build_link_positions()
+	article_index = pd.Index(articles)
+	sources = article_index.get_indexer(link_positions.index.get_level_values(0))
+	titles = article_index.get_indexer(link_positions.index.get_level_values(1))
+	known = (sources >= 0) & (titles >= 0)
+
+	keys = sources[known].astype(np.int64) * len(articles) + titles[known]
+	order = np.argsort(keys)
+	return keys[order], link_positions.to_numpy(dtype=np.float64)[known][order]
+
+
 def get_click_positions(paths):
 	"""
 	Get click positions of the paths
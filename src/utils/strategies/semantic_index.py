@@ -0,0 +1,161 @@
+from functools import cache
+
+import numpy as np
+import numpy.typing as npt
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import normalize
+
+from src.utils import logger
+from src.utils.cache import atomic_path
+from src.utils.constants import LSA_N_COMPONENTS, SEMANTIC_DATA_DIR
+from src.utils.grouped_stats import segment_ids
+from src.utils.strategies.semantic_strategy import build_lsa_embeddings, tf_idf_model_key
+
+
+class SemanticIndex:
+	"""Inverted file (IVF) index over the normalized LSA embeddings of the articles.
+
+	The articles are partitioned into clusters by spherical k-means. A query only scans the articles of
+	the `n_probe` clusters whose centroids are the most similar to it, and the candidates are then ranked
+	with their exact cosine similarity to the query.
+	"""
+
+	def __init__(
+		self,
+		embeddings: npt.NDArray[np.float32],
+		centroids: npt.NDArray[np.float32],
+		list_indptr: npt.NDArray[np.int64],
+		list_ids: npt.NDArray[np.int64],
+	):
+		self.embeddings = embeddings
+		self.centroids = centroids
+		self.list_indptr = list_indptr
+		self.list_ids = list_ids
+
+	def _search(
+		self, article_ids: npt.NDArray[np.int64], k: int, n_probe: int, exclude_self: bool
+	) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+		queries = self.embeddings[article_ids]
+		n_probe = min(n_probe, len(self.centroids))
+
+		# Select the closest clusters of each query
+		centroid_scores = queries @ self.centroids.T
+		probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe].ravel()
+
+		# Gather the articles of the probed clusters, one segment of candidates per query
+		list_lengths = np.diff(self.list_indptr)[probes]
+		candidates_per_query = list_lengths.reshape(len(article_ids), n_probe).sum(axis=1)
+		indptr = np.zeros(len(article_ids) + 1, dtype=np.int64)
+		np.cumsum(candidates_per_query, out=indptr[1:])
+
+		list_offsets = np.cumsum(list_lengths) - list_lengths
+		positions = np.arange(indptr[-1]) + np.repeat(self.list_indptr[probes] - list_offsets, list_lengths)
+		candidates = self.list_ids[positions]
+		query_index = segment_ids(indptr)
+
+		similarities = np.einsum("ij,ij->i", queries[query_index], self.embeddings[candidates])
+		if exclude_self:
+			similarities[candidates == article_ids[query_index]] = -np.inf
+
+		# Keep the k best candidates of each query
+		order = np.lexsort((-similarities, query_index))
+		rank_in_query = np.arange(len(order)) - indptr[query_index[order]]
+		best = order[rank_in_query < k]
+
+		ids = np.full((len(article_ids), k), -1, dtype=np.int64)
+		scores = np.full((len(article_ids), k), np.nan, dtype=np.float32)
+		ids[query_index[best], rank_in_query[rank_in_query < k]] = candidates[best]
+		scores[query_index[best], rank_in_query[rank_in_query < k]] = similarities[best]
+		# The query itself is ranked last when excluded, it is treated as padding
+		ids[~np.isfinite(scores)] = -1
+		scores[ids == -1] = np.nan
+
+		return ids, scores
+
+	def top_k_similar(
+		self,
+		article_ids: npt.ArrayLike,
+		k: int = 10,
+		n_probe: int = 8,
+		exclude_self: bool = True,
+		chunk_size: int = 256,
+	) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+		"""Find the approximate `k` most similar articles of each query article.
+
+		Args:
+			article_ids (array-like): the indices (as in `build_tf_idf`) of the query articles
+			k (int): the number of neighbours returned for each query
+			n_probe (int): the number of clusters scanned for each query, more is slower but more accurate
+			exclude_self (bool): whether a query article can be returned as its own neighbour
+			chunk_size (int): the number of queries processed at once, to bound memory usage
+
+		Returns:
+			ids (np.ndarray): a (n_queries, k) array with the neighbours sorted by decreasing similarity,
+			padded with -1 when less than `k` candidates were found
+			similarities (np.ndarray): the matching (n_queries, k) cosine similarities, NaN for padding
+		"""
+		article_ids = np.atleast_1d(np.asarray(article_ids, dtype=np.int64))
+		results = [
+			self._search(article_ids[start : start + chunk_size], k, n_probe, exclude_self)
+			for start in range(0, len(article_ids), chunk_size)
+		]
+		if not results:
+			return np.zeros((0, k), dtype=np.int64), np.zeros((0, k), dtype=np.float32)
+
+		ids, similarities = zip(*results)
+		return np.vstack(ids), np.vstack(similarities)
+
+
+def build_semantic_index(n_lists: int, n_components: int = LSA_N_COMPONENTS) -> None:
+	"""Cluster the LSA embeddings with spherical k-means and store the resulting IVF index on disk.
+
+	Args:
+		n_lists (int): the number of clusters of the index
+		n_components (int): the dimension of the LSA embeddings
+	"""
+	embeddings, _ = build_lsa_embeddings(n_components)
+
+	logger.info(f"building the semantic index with {n_lists} clusters...")
+	kmeans = KMeans(n_clusters=n_lists, n_init=1, random_state=0).fit(embeddings)
+	centroids = normalize(kmeans.cluster_centers_, norm="l2").astype(np.float32)
+
+	list_ids = np.argsort(kmeans.labels_, kind="stable")
+	list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+	np.cumsum(np.bincount(kmeans.labels_, minlength=n_lists), out=list_indptr[1:])
+
+	SEMANTIC_DATA_DIR.mkdir(parents=True, exist_ok=True)
+	with atomic_path(SEMANTIC_DATA_DIR / f"ivf_{tf_idf_model_key()}_{n_components}_{n_lists}.npz") as temporary_path:
+		np.savez(temporary_path, centroids=centroids, list_indptr=list_indptr, list_ids=list_ids)
+
+
+@cache
+def load_semantic_index(n_lists: int | None = None, n_components: int = LSA_N_COMPONENTS) -> SemanticIndex:
+	"""Load the IVF index over the article embeddings, building it first if it is not on disk.
+
+	Args:
+		n_lists (int): the number of clusters of the index, defaults to the square root of the number of articles
+		n_components (int): the dimension of the LSA embeddings
+
+	Returns:
+		SemanticIndex: the index
+	"""
+	embeddings, _ = build_lsa_embeddings(n_components)
+	if n_lists is None:
+		n_lists = int(np.sqrt(len(embeddings)))
+
+	index_path = SEMANTIC_DATA_DIR / f"ivf_{tf_idf_model_key()}_{n_components}_{n_lists}.npz"
+	if not index_path.is_file():
+		build_semantic_index(n_lists, n_components)
+
+	with np.load(index_path) as index:
+		return SemanticIndex(embeddings, index["centroids"], index["list_indptr"], index["list_ids"])
+
+
+def top_k_similar(
+	article_ids: npt.ArrayLike, k: int = 10, n_probe: int = 8
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+	"""Find the approximate `k` most similar articles of each query article with the default semantic index.
+
+	See `SemanticIndex.top_k_similar`.
+	"""
+	return load_semantic_index().top_k_similar(article_ids, k=k, n_probe=n_probe)
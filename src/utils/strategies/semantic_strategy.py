@@ -1,46 +1,218 @@
+import hashlib
+import json
+from collections.abc import Sequence
 from functools import cache
-from urllib.parse import quote
+from pathlib import Path
 
-from scipy.sparse import spmatrix
-from scipy.stats import spearmanr
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse, spmatrix
+from scipy.stats import pearsonr, spearmanr
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 
-from src.utils.constants import PLAINTEXT_DIR
-from src.utils.data import load_graph_data
+from src.utils import logger
+from src.utils.cache import SimilarityCache, artifact_key, atomic_path
+from src.utils.constants import (
+	LSA_N_COMPONENTS,
+	SEMANTIC_BACKEND,
+	SEMANTIC_DATA_DIR,
+	SIMILARITY_CACHE_MAX_BYTES,
+	SIMILARITY_CACHE_SPILL_TO_DISK,
+)
+from src.utils.data import clean_path, load_graph_data
+from src.utils.data.corpus import load_corpus
+from src.utils.data.paths import PathArrays, filter_csr
+from src.utils.grouped_stats import spearman_with_index
+
+
+TF_IDF_PARAMS = dict(
+	stop_words="english",
+	max_features=8000,
+)
+
+
+@cache
+def tf_idf_model_key() -> str:
+	"""Return the key identifying the TF-IDF model, derived from the corpus hash and the vectorizer parameters."""
+	corpus = load_corpus()
+	key_data = json.dumps({"corpus": corpus.corpus_hash, "params": TF_IDF_PARAMS}, sort_keys=True)
+	return hashlib.sha256(key_data.encode("utf-8")).hexdigest()[:16]
+
+
+def _fit_tf_idf(model_path: Path) -> None:
+	# Fit the vectorizer on the packed corpus and save everything that is needed to use it again
+	corpus = load_corpus()
+	logger.info(f"fitting TF-IDF on {len(corpus)} articles...")
+	vectorizer = TfidfVectorizer(**TF_IDF_PARAMS)
+	tf_idf = vectorizer.fit_transform(corpus.texts()).tocsr()
+
+	vocabulary = np.empty(len(vectorizer.vocabulary_), dtype=object)
+	for term, i in vectorizer.vocabulary_.items():
+		vocabulary[i] = term
+
+	model_path.parent.mkdir(parents=True, exist_ok=True)
+	with atomic_path(model_path) as temporary_path:
+		np.savez(
+			temporary_path,
+			vocabulary=vocabulary.astype(str),
+			idf=vectorizer.idf_,
+			data=tf_idf.data,
+			indices=tf_idf.indices,
+			indptr=tf_idf.indptr,
+			shape=np.array(tf_idf.shape),
+		)
+
+
+@cache
+def _load_tf_idf_model() -> dict[str, npt.NDArray]:
+	model_path = SEMANTIC_DATA_DIR / f"tf_idf_{tf_idf_model_key()}.npz"
+	if not model_path.is_file():
+		_fit_tf_idf(model_path)
+
+	with np.load(model_path) as model:
+		return {k: model[k] for k in model.files}
 
 
 @cache
 def build_tf_idf() -> tuple[spmatrix, dict]:
 	"""Builds a TF-IDF matrix from the collection of wikispeedia articles.
 
+	The model is fitted once on the packed corpus (see `src.utils.data.corpus`) and saved in
+	`SEMANTIC_DATA_DIR`, it is then loaded from disk as long as the corpus and `TF_IDF_PARAMS` do not change.
+
 	Returns:
 	    tf_idf (scipy.sparse.csr.csr_matrix): The TF-IDF matrix.
 	    article_to_index (dict): A mapping from article names to their index in the TF-IDF matrix.
 	"""
-	# Fetch articles
-	graph_data = load_graph_data()
+	model = _load_tf_idf_model()
+	tf_idf = csr_matrix((model["data"], model["indices"], model["indptr"]), shape=tuple(model["shape"]))
+	article_to_index = {article: i for i, article in enumerate(load_corpus().articles)}
+	return tf_idf, article_to_index
 
-	# Build tf_idf vectorizer
-	texts = []
-	article_to_index = {}
-	for i, article in enumerate(graph_data["articles"]["name"]):
-		filepath = f"{PLAINTEXT_DIR}/{quote(article)}.txt"
-		article_to_index[article] = i
-		with open(filepath, encoding="utf-8") as f:
-			texts.append(f.read())
-
-	vectorizer = TfidfVectorizer(
-		stop_words="english",
-		max_features=8000,
-	)
 
-	tf_idf = vectorizer.fit_transform(texts)
-	return tf_idf, article_to_index
+def load_tf_idf_vectorizer() -> TfidfVectorizer:
+	"""Return the fitted TF-IDF vectorizer, rebuilt from the saved vocabulary and IDF weights.
+
+	Returns:
+		TfidfVectorizer: a vectorizer that can `transform` new texts in the same space as `build_tf_idf`
+	"""
+	model = _load_tf_idf_model()
+	vectorizer = TfidfVectorizer(**TF_IDF_PARAMS, vocabulary={term: i for i, term in enumerate(model["vocabulary"])})
+	vectorizer.idf_ = model["idf"]
+	return vectorizer
+
 
 @cache
+def build_normalized_tf_idf() -> tuple[csr_matrix, dict]:
+	"""Return the TF-IDF matrix with L2-normalized rows, so that cosine similarities are plain dot products.
+
+	Returns:
+	    tf_idf (scipy.sparse.csr_matrix): The row-normalized TF-IDF matrix.
+	    article_to_index (dict): A mapping from article names to their index in the TF-IDF matrix.
+	"""
+	tf_idf, article_to_index = build_tf_idf()
+	return normalize(tf_idf, norm="l2").tocsr(), article_to_index
+
+
+@cache
+def build_lsa_embeddings(n_components: int = LSA_N_COMPONENTS) -> tuple[npt.NDArray[np.float32], dict]:
+	"""Compute dense article embeddings with a truncated SVD of the TF-IDF matrix (latent semantic analysis).
+
+	The embeddings are L2-normalized and stored as float32 in `SEMANTIC_DATA_DIR`, keyed by the TF-IDF model
+	and the number of components, so that they are only computed once.
+
+	Args:
+		n_components (int): the dimension of the embeddings, typically between 128 and 512
+
+	Returns:
+		embeddings (np.ndarray): the (n_articles, n_components) embedding matrix
+		article_to_index (dict): A mapping from article names to their index in the embedding matrix.
+	"""
+	tf_idf, article_to_index = build_tf_idf()
+	embeddings_path = SEMANTIC_DATA_DIR / f"lsa_{tf_idf_model_key()}_{n_components}.npy"
+
+	if not embeddings_path.is_file():
+		logger.info(f"computing {n_components}-dimensional LSA embeddings...")
+		svd = TruncatedSVD(n_components=n_components, random_state=0)
+		embeddings = normalize(svd.fit_transform(tf_idf), norm="l2").astype(np.float32)
+		SEMANTIC_DATA_DIR.mkdir(parents=True, exist_ok=True)
+		with atomic_path(embeddings_path) as temporary_path:
+			np.save(temporary_path, embeddings)
+
+	return np.load(embeddings_path), article_to_index
+
+
+_semantic_backend = SEMANTIC_BACKEND
+_lsa_n_components = LSA_N_COMPONENTS
+
+
+def set_semantic_backend(backend: str, n_components: int = LSA_N_COMPONENTS) -> None:
+	"""Select the article vectors used by the semantic strategy.
+
+	Args:
+		backend (str): "tfidf" for the sparse TF-IDF vectors or "lsa" for the dense LSA embeddings
+		n_components (int): the dimension of the LSA embeddings, ignored for "tfidf"
+	"""
+	global _semantic_backend, _lsa_n_components
+	if backend not in ("tfidf", "lsa"):
+		raise ValueError(f"Unknown semantic backend '{backend}', expected 'tfidf' or 'lsa'.")
+
+	_semantic_backend = backend
+	_lsa_n_components = n_components
+	# The cached similarity matrix depends on the backend
+	load_target_similarity_matrix.cache_clear()
+
+
+def get_semantic_backend() -> str:
+	"""Return the name of the backend currently used by the semantic strategy."""
+	return _semantic_backend
+
+
+def get_article_vectors() -> tuple[csr_matrix | npt.NDArray[np.float32], dict]:
+	"""Return the L2-normalized article vectors of the current semantic backend.
+
+	Returns:
+		vectors (scipy.sparse.csr_matrix or np.ndarray): one normalized row per article
+		article_to_index (dict): A mapping from article names to their row in `vectors`.
+	"""
+	if _semantic_backend == "lsa":
+		return build_lsa_embeddings(_lsa_n_components)
+	return build_normalized_tf_idf()
+
+
+def _row_dot_products(vectors: csr_matrix | npt.NDArray, rows: npt.NDArray, cols: npt.NDArray) -> npt.NDArray[np.float64]:
+	# Row-wise dot products between vectors[rows] and vectors[cols]
+	if issparse(vectors):
+		return np.asarray(vectors[rows].multiply(vectors[cols]).sum(axis=1)).ravel()
+	return np.einsum("ij,ij->i", vectors[rows], vectors[cols], dtype=np.float64)
+
+
+def semantic_backend_key() -> str:
+	"""Return a key identifying the current backend and its parameters, used to name the cached artifacts."""
+	return f"lsa{_lsa_n_components}" if _semantic_backend == "lsa" else "tfidf"
+
+
+@cache
+def _get_similarity_cache(backend_key: str) -> SimilarityCache:
+	spill_path = None
+	if SIMILARITY_CACHE_SPILL_TO_DISK:
+		spill_path = SEMANTIC_DATA_DIR / f"similarity_cache_{tf_idf_model_key()}_{backend_key}.sqlite"
+	return SimilarityCache(SIMILARITY_CACHE_MAX_BYTES, spill_path)
+
+
+def get_similarity_cache() -> SimilarityCache:
+	"""Return the pairwise similarity cache of the current semantic backend, e.g. to inspect its `stats()`."""
+	return _get_similarity_cache(semantic_backend_key())
+
+
 def get_semantic_similarity(title1: str, title2: str) -> float:
-	"""Use the TF-IDF matrix to compute the semantic similarity between two articles
+	"""Use the article vectors to compute the semantic similarity between two articles
+
+	The similarities are cached by `get_similarity_cache`, which is bounded in memory
+	(`SIMILARITY_CACHE_MAX_BYTES`) and can be shared across processes (`SIMILARITY_CACHE_SPILL_TO_DISK`).
 
 	Args:
 		title1 (str): The title of the first article.
@@ -48,12 +220,141 @@ def get_semantic_similarity(title1: str, title2: str) -> float:
 	Returns:
 		float: A similarity score between 0 and 1, where 1 indicates identical titles.
 	"""
-	tf_idf, article_to_index = build_tf_idf()
+	vectors, article_to_index = get_article_vectors()
+	index1, index2 = article_to_index[title1], article_to_index[title2]
+
+	compute = lambda: _row_dot_products(vectors, np.array([index1]), np.array([index2]))[0]
+	return get_similarity_cache().get_or_compute(index1, index2, compute)
+
+
+def batch_semantic_similarities(
+	indptr: npt.NDArray[np.int64],
+	article_ids: npt.NDArray[np.int64],
+	target_ids: npt.NDArray[np.int64],
+	chunk_size: int = 200_000,
+) -> npt.NDArray[np.float64]:
+	"""Compute the similarity between every step of every path and the target of its path.
+
+	The paths are given in CSR form (see `PathArrays`). Each distinct (article, target) pair is only
+	computed once, and all pairs are evaluated with row-wise dot products on the normalized article
+	vectors, `chunk_size` pairs at a time to bound memory usage.
+
+	Args:
+		indptr (np.ndarray): offsets of each path in `article_ids`
+		article_ids (np.ndarray): the concatenated article ids of all the paths
+		target_ids (np.ndarray): the id of the target of each path
+		chunk_size (int): the maximum number of pairs evaluated in one operation
+
+	Returns:
+		np.ndarray: the similarities, aligned with `article_ids`
+	"""
+	vectors, _ = get_article_vectors()
+	n_articles = vectors.shape[0]
+
+	targets = np.repeat(np.asarray(target_ids, dtype=np.int64), np.diff(indptr))
+	pair_keys, inverse = np.unique(np.asarray(article_ids, dtype=np.int64) * n_articles + targets, return_inverse=True)
+	rows, cols = np.divmod(pair_keys, n_articles)
+
+	similarities = np.empty(len(pair_keys), dtype=np.float64)
+	for start in range(0, len(pair_keys), chunk_size):
+		end = start + chunk_size
+		similarities[start:end] = _row_dot_products(vectors, rows[start:end], cols[start:end])
+
+	return similarities[inverse.ravel()]
+
+
+def _get_distinct_targets(article_to_index: dict) -> list[str]:
+	# All the targets of the games that have a TF-IDF vector, in a deterministic order
+	graph_data = load_graph_data()
+	targets = set(graph_data["paths_finished"]["target"]) | set(graph_data["paths_unfinished"]["target"])
+	return sorted(target for target in targets if target in article_to_index)
+
 
-	vector1 = tf_idf[article_to_index[title1]]
-	vector2 = tf_idf[article_to_index[title2]]
-	similarity = cosine_similarity(vector1, vector2)[0][0]
-	return similarity
+def _target_similarity_files(targets: list[str], dtype: npt.DTypeLike) -> tuple[Path, Path]:
+	# The matrix depends on the TF-IDF model, the backend and the targets, its files are keyed accordingly
+	key = f"{tf_idf_model_key()}_{semantic_backend_key()}_{artifact_key(targets)}"
+	stem = f"target_similarity_{key}_{np.dtype(dtype).name}"
+	return SEMANTIC_DATA_DIR / f"{stem}.npy", SEMANTIC_DATA_DIR / f"{stem}.json"
+
+
+def build_target_similarity_matrix(dtype: npt.DTypeLike = np.float64, chunk_size: int = 256) -> None:
+	"""Precompute the similarity between every game target and every article, and store it on disk.
+
+	The matrix has one row per distinct target of `paths_finished` and `paths_unfinished` and one column
+	per article. It is written as a `.npy` file in `SEMANTIC_DATA_DIR` so that it can be memory-mapped by
+	`load_target_similarity_matrix`, the list of targets (the row order) is stored next to it.
+
+	Args:
+		dtype: the dtype of the stored similarities, `np.float32` halves the file size at the cost of about
+			1e-7 of precision
+		chunk_size (int): the number of target rows computed in one sparse product
+	"""
+	vectors, article_to_index = get_article_vectors()
+	targets = _get_distinct_targets(article_to_index)
+	target_ids = np.array([article_to_index[target] for target in targets], dtype=np.int64)
+
+	matrix_path, targets_path = _target_similarity_files(targets, dtype)
+	SEMANTIC_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+	# The targets are written first, the matrix is only loaded when its file exists
+	with atomic_path(targets_path) as temporary_path, open(temporary_path, "w", encoding="utf-8") as f:
+		json.dump(targets, f)
+
+	logger.info(f"computing the {len(targets)} x {vectors.shape[0]} target similarity matrix ({np.dtype(dtype).name})...")
+	with atomic_path(matrix_path) as temporary_path:
+		matrix = np.lib.format.open_memmap(
+			temporary_path,
+			mode="w+",
+			dtype=dtype,
+			shape=(len(targets), vectors.shape[0]),
+		)
+		vectors_t = vectors.T.tocsc() if issparse(vectors) else vectors.T
+		for start in range(0, len(targets), chunk_size):
+			end = start + chunk_size
+			block = vectors[target_ids[start:end]] @ vectors_t
+			matrix[start:end] = block.toarray() if issparse(block) else block
+		matrix.flush()
+		del matrix
+
+
+@cache
+def load_target_similarity_matrix(dtype: npt.DTypeLike = np.float64) -> tuple[np.memmap, dict[str, int]]:
+	"""Memory-map the target x article similarity matrix, building it first if it is not on disk.
+
+	The similarity between article `a` and target `t` is `matrix[target_to_row[t], article_to_index[a]]`,
+	where `article_to_index` is the mapping returned by `build_tf_idf`.
+
+	Args:
+		dtype: the dtype of the stored similarities, see `build_target_similarity_matrix`
+
+	Returns:
+		matrix (np.memmap): the read-only target x article similarity matrix
+		target_to_row (dict): a mapping from target names to their row in the matrix
+	"""
+	_, article_to_index = get_article_vectors()
+	matrix_path, targets_path = _target_similarity_files(_get_distinct_targets(article_to_index), dtype)
+	if not matrix_path.is_file() or not targets_path.is_file():
+		build_target_similarity_matrix(dtype)
+
+	matrix = np.load(matrix_path, mmap_mode="r")
+	with open(targets_path, encoding="utf-8") as f:
+		target_to_row = {target: i for i, target in enumerate(json.load(f))}
+
+	return matrix, target_to_row
+
+
+def get_target_similarities(article_ids: npt.ArrayLike, target_rows: npt.ArrayLike) -> npt.NDArray:
+	"""Read the similarities between articles and targets from the precomputed target similarity matrix.
+
+	Args:
+		article_ids (array-like): the TF-IDF indices of the articles
+		target_rows (array-like): the rows of the targets in the matrix, broadcastable with `article_ids`
+
+	Returns:
+		np.ndarray: the similarities, with the broadcasted shape of the inputs
+	"""
+	matrix, _ = load_target_similarity_matrix()
+	return matrix[np.asarray(target_rows, dtype=np.int64), np.asarray(article_ids, dtype=np.int64)]
 
 
 def get_semantic_similarities(path: list[str], target_article: str) -> list[float]:
@@ -61,23 +362,90 @@ def get_semantic_similarities(path: list[str], target_article: str) -> list[floa
 
 	If the path contains '<', the article that was "backtracked" will be ignored
 	"""
-	# Remove '<' from the path
-	clean_path = []  # Path without '<'
-	for p in path:
-		if p == "<":
-			clean_path.pop()
-		elif p != target_article:
-			clean_path.append(p)
+	# Remove '<' from the path, the article that was "backtracked" is removed as well
+	articles = [article for article in clean_path(path) if article != target_article]
+
+	# Read the similarities from the precomputed matrix when the target is a game target
+	_, article_to_index = get_article_vectors()
+	_, target_to_row = load_target_similarity_matrix()
+	if target_article in target_to_row:
+		article_ids = [article_to_index[article] for article in articles]
+		return get_target_similarities(article_ids, target_to_row[target_article]).astype(float).tolist()
 
 	# Compute the similarity score of each article in the path with the target article
 	similarities = []
-	for article in clean_path:
+	for article in articles:
 		similarity = get_semantic_similarity(article, target_article)
 		similarities.append(similarity)
 
+	# Write the new similarities to the spill database now, `atexit` does not run in pool workers
+	get_similarity_cache().flush()
 	return similarities
 
 
+def similarities_from_arrays(
+	path_arrays: PathArrays, target_ids: npt.NDArray[np.int64]
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+	"""Compute the similarities of the articles of the paths with their target, in CSR form.
+
+	The backtracked articles (see `clean_path`) and the occurrences of the target are ignored, as in
+	`get_semantic_similarities`.
+
+	Args:
+		path_arrays (PathArrays): the paths, encoded with the articles of the TF-IDF matrix
+		target_ids (np.ndarray): the id of the target article of each path
+
+	Returns:
+		indptr (np.ndarray): offsets of the similarities of each path
+		similarities (np.ndarray): the flat similarities
+	"""
+	vectors, _ = get_article_vectors()
+	if len(path_arrays.articles) != vectors.shape[0]:
+		raise ValueError("The paths must be encoded with the articles of the TF-IDF matrix.")
+
+	target_ids = np.asarray(target_ids, dtype=np.int64)
+	indptr, article_ids = path_arrays.variant("popped")
+	indptr, article_ids = filter_csr(indptr, article_ids, article_ids != np.repeat(target_ids, np.diff(indptr)))
+
+	_, target_to_row = load_target_similarity_matrix()
+	target_rows = np.array([target_to_row.get(target, -1) for target in path_arrays.articles[target_ids]], dtype=np.int64)
+	if (target_rows >= 0).all():
+		similarities = get_target_similarities(article_ids, np.repeat(target_rows, np.diff(indptr))).astype(float)
+	else:
+		similarities = batch_semantic_similarities(indptr, article_ids, target_ids)
+
+	return indptr, similarities
+
+
+def _batch_similarities_csr(
+	paths: Sequence[list[str]], target_articles: Sequence[str]
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+	# Similarities of all the cleaned paths with their target, in CSR form
+	_, article_to_index = get_article_vectors()
+
+	path_arrays = PathArrays.from_paths(paths, list(article_to_index))
+	target_ids = np.array([article_to_index[target] for target in target_articles], dtype=np.int64)
+
+	return similarities_from_arrays(path_arrays, target_ids)
+
+
+def get_semantic_similarities_batch(paths: Sequence[list[str]], target_articles: Sequence[str]) -> list[npt.NDArray]:
+	"""Batched version of `get_semantic_similarities` for many (path, target) pairs at once.
+
+	Args:
+		paths (Sequence[list[str]]): the paths, possibly containing '<'
+		target_articles (Sequence[str]): the target article of each path
+
+	Returns:
+		list[np.ndarray]: the similarities of each path, as returned by `get_semantic_similarities`
+	"""
+	if len(paths) == 0:
+		return []
+
+	indptr, similarities = _batch_similarities_csr(paths, target_articles)
+	return np.split(similarities, indptr[1:-1])
+
+
 def semantic_increase_score(path: list[str], target_article: str = None) -> float | None:
 	"""Compute the Semantic Increase Score (SIS) for a given path of articles relative to a target article.
 
@@ -110,3 +478,95 @@ def semantic_increase_score(path: list[str], target_article: str = None) -> floa
 	# Return the semantic increase score
 	correlation, p_value = spearmanr(range(len(similarities)), similarities)
 	return correlation
+
+
+def semantic_increase_scores_from_arrays(path_arrays: PathArrays, target_ids: npt.ArrayLike) -> npt.NDArray:
+	"""Compute the SIS of precomputed paths (e.g. `graph_data["paths_finished_arrays"]`).
+
+	Args:
+		path_arrays (PathArrays): the paths, encoded with the articles of the TF-IDF matrix
+		target_ids (array-like): the id of the target article of each path
+
+	Returns:
+		np.ndarray: the SIS score of each path, equal to `semantic_increase_score(path, target)`
+	"""
+	indptr, similarities = similarities_from_arrays(path_arrays, target_ids)
+	scores = spearman_with_index(indptr, similarities)
+	scores[np.diff(indptr) <= 1] = 1  # Paths with one article have an SIS score of 1
+
+	return scores
+
+
+def semantic_increase_scores(paths: Sequence[list[str]], target_articles: Sequence[str] | None = None) -> npt.NDArray:
+	"""Vectorized version of `semantic_increase_score` computing the SIS of many paths in a single call.
+
+	The similarities of all the paths are computed at once, and the Spearman correlations with the step
+	index are computed segment-wise on the flat array (see `src.utils.grouped_stats.spearman_with_index`).
+
+	Args:
+		paths (Sequence[list[str]]): the paths of articles, possibly containing '<'
+		target_articles (Sequence[str]): the target article of each path. If None, the last article of
+	                                     each path is considered the target article
+
+	Returns:
+		np.ndarray: the SIS score of each path, equal to `semantic_increase_score(path, target)`
+	"""
+	if target_articles is None:
+		target_articles = [path[-1] for path in paths]
+
+	if len(paths) == 0:
+		return np.zeros(0, dtype=np.float64)
+
+	_, article_to_index = get_article_vectors()
+	path_arrays = PathArrays.from_paths(paths, list(article_to_index))
+	target_ids = np.array([article_to_index[target] for target in target_articles], dtype=np.int64)
+
+	return semantic_increase_scores_from_arrays(path_arrays, target_ids)
+
+
+def compare_semantic_backends(
+	paths: Sequence[list[str]],
+	target_articles: Sequence[str],
+	n_components: int = LSA_N_COMPONENTS,
+) -> tuple[pd.DataFrame, pd.Series]:
+	"""Compare the SIS obtained with the TF-IDF vectors and with the LSA embeddings on the same paths.
+
+	Args:
+		paths (Sequence[list[str]]): the paths to score
+		target_articles (Sequence[str]): the target article of each path
+		n_components (int): the dimension of the LSA embeddings
+
+	Returns:
+		scores (pd.DataFrame): the SIS of each path with both backends, in the columns `tfidf` and `lsa`
+		report (pd.Series): agreement statistics between the two backends and the memory used by their vectors
+	"""
+	previous_backend, previous_components = _semantic_backend, _lsa_n_components
+
+	scores = {}
+	memory = {}
+	try:
+		for backend in ("tfidf", "lsa"):
+			set_semantic_backend(backend, n_components)
+			vectors, _ = get_article_vectors()
+			memory[backend] = vectors.data.nbytes + vectors.indices.nbytes + vectors.indptr.nbytes if issparse(vectors) else vectors.nbytes
+			scores[backend] = semantic_increase_scores(paths, target_articles)
+	finally:
+		set_semantic_backend(previous_backend, previous_components)
+
+	scores = pd.DataFrame(scores, dtype=float)
+	valid = scores.dropna()
+
+	report = pd.Series(
+		dict(
+			n_paths=len(scores),
+			n_compared=len(valid),
+			pearson=pearsonr(valid["tfidf"], valid["lsa"])[0] if len(valid) > 1 else np.nan,
+			spearman=spearmanr(valid["tfidf"], valid["lsa"])[0] if len(valid) > 1 else np.nan,
+			mean_absolute_difference=(valid["tfidf"] - valid["lsa"]).abs().mean(),
+			sign_agreement=(np.sign(valid["tfidf"]) == np.sign(valid["lsa"])).mean(),
+			tfidf_memory_bytes=memory["tfidf"],
+			lsa_memory_bytes=memory["lsa"],
+		)
+	)
+
+	return scores, report
@@ -0,0 +1,143 @@
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from src.utils.data.paths import PathArrays
+from src.utils.grouped_stats import segment_ids
+from src.utils.strategies.hub_focused_strategy import get_hub_mask
+from src.utils.strategies.link_strategy import build_link_positions
+from src.utils.strategies.semantic_strategy import similarities_from_arrays
+
+
+def _reverse_segment_cumsum(indptr: npt.NDArray[np.int64], values: npt.NDArray) -> npt.NDArray:
+	# Sum of the values from each element to the end of its segment
+	totals = np.cumsum(values[::-1])[::-1]
+	ends = np.append(totals, 0)[indptr[1:]]
+	return totals - np.repeat(ends, np.diff(indptr))
+
+
+def _suffix_spearman(
+	indptr: npt.NDArray[np.int64], values: npt.NDArray[np.float64], max_pairs: int = 5_000_000
+) -> npt.NDArray[np.float64]:
+	# Spearman correlation between the values and their position, for every suffix of every segment.
+	# The result has one entry per element, the suffix starting at that element.
+	#
+	# The (average) rank of x_j in the suffix starting at k is 1 + #{i >= k: x_i < x_j} + #{i >= k, i != j: x_i = x_j} / 2,
+	# which is obtained for all k at once by a reverse cumulative sum over the pairs (i, j) of the segment.
+	# The rank sums are multiples of 1/2, so the closed form of the correlation is computed exactly.
+	result = np.empty(len(values), dtype=np.float64)
+	lengths = np.diff(indptr)
+
+	# Process the segments by chunks to bound the memory used by the pairs
+	cumulative_pairs = np.append(0, np.cumsum(lengths**2))
+	first = 0
+	while first < len(lengths):
+		last = max(first + 1, np.searchsorted(cumulative_pairs, cumulative_pairs[first] + max_pairs, side="right") - 1)
+		start, end = indptr[first], indptr[last]
+		result[start:end] = _suffix_spearman_chunk(indptr[first : last + 1] - start, values[start:end])
+		first = last
+
+	return result
+
+
+def _suffix_spearman_chunk(indptr: npt.NDArray[np.int64], values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+	lengths = np.diff(indptr)
+	segments = segment_ids(indptr)
+
+	# One pair (j, i) for every two elements of the same segment, grouped by j and sorted by i
+	pair_lengths = lengths[segments]
+	pair_indptr = np.zeros(len(values) + 1, dtype=np.int64)
+	np.cumsum(pair_lengths, out=pair_indptr[1:])
+	j = np.repeat(np.arange(len(values)), pair_lengths)
+	i = indptr[segments][j] + np.arange(len(j)) - pair_indptr[j]
+
+	less = (values[i] < values[j]).astype(np.float64)
+	equal = ((values[i] == values[j]) & (i != j)).astype(np.float64)
+
+	# For the pair (j, i), the rank of x_j in the suffix starting at i
+	rank = 1 + _reverse_segment_cumsum(pair_indptr, less) + _reverse_segment_cumsum(pair_indptr, equal) / 2
+
+	# Only the pairs with j >= i contribute to the suffix starting at i
+	contributes = j >= i
+	i, j, rank = i[contributes], j[contributes], rank[contributes]
+	rank_position_sum = np.bincount(i, weights=rank * (j - i), minlength=len(values))
+	rank_square_sum = np.bincount(i, weights=rank**2, minlength=len(values))
+
+	n = (indptr[segments + 1] - np.arange(len(values))).astype(np.float64)
+	covariance = rank_position_sum - n * (n + 1) * (n - 1) / 4
+	rank_variance = rank_square_sum - n * (n + 1) ** 2 / 4
+	position_variance = n * (n**2 - 1) / 12
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		correlation = np.clip(covariance / np.sqrt(rank_variance * position_variance), -1, 1)
+	correlation[rank_variance <= 0] = np.nan
+	# Paths with one article have an SIS score of 1
+	correlation[n <= 1] = 1
+
+	return correlation
+
+
+def suffix_scores(path_arrays: PathArrays, top_link_threshold: float = 0.3) -> pd.DataFrame:
+	"""Compute the strategy scores of every suffix of the (cleaned) paths, in a single pass over all the paths.
+
+	The suffix starting at `rank` of a path `p` is `p[rank:]`, where the backtracked articles are removed from `p`
+	(the "popped" variant, see `clean_path`). The scores are the same as calling `compute_hub_usage_ratio`,
+	`top_link_ratio` and `semantic_increase_score` on every suffix, but no suffix is materialized:
+
+	- the hub usage and top link ratios are reverse cumulative sums of per-step (and per-click) indicators
+	- the SIS uses the rank of each step within every suffix, obtained by counting the smaller values after it
+
+	Args:
+		path_arrays (PathArrays): the paths, encoded with the articles of the TF-IDF matrix (e.g. `paths_finished_arrays`)
+		top_link_threshold (float): the relative position under which a link is considered a top link
+
+	Returns:
+		pd.DataFrame: one row per step of each cleaned path, indexed by the index of the path, with the columns
+		`rank`, `hub_usage_ratio`, `top_link_ratio` and `semantic_increase_score`
+	"""
+	indptr, article_ids = path_arrays.variant("popped")
+	lengths = np.diff(indptr)
+	segments = segment_ids(indptr)
+	rank = np.arange(len(article_ids)) - indptr[segments]
+	suffix_lengths = (lengths[segments] - rank).astype(np.float64)
+
+	# Hub usage ratio: number of hubs from each step to the end of the path
+	is_hub = get_hub_mask(path_arrays.articles)
+	hub_usage_ratio = _reverse_segment_cumsum(indptr, is_hub[article_ids].astype(np.float64)) / suffix_lengths
+
+	# Top link ratio: the click from step s to step s + 1 belongs to all the suffixes starting at or before s
+	has_next = np.ones(len(article_ids), dtype=bool)
+	has_next[indptr[1:][lengths > 0] - 1] = False
+	link_positions = build_link_positions().reindex(
+		pd.MultiIndex.from_arrays(
+			[path_arrays.articles[article_ids[has_next]], path_arrays.articles[article_ids[np.flatnonzero(has_next) + 1]]]
+		)
+	)
+	clicks = np.zeros(len(article_ids))
+	top_clicks = np.zeros(len(article_ids))
+	clicks[has_next] = link_positions.notna().to_numpy()
+	top_clicks[has_next] = (link_positions <= top_link_threshold).to_numpy()
+	click_counts = _reverse_segment_cumsum(indptr, clicks)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		top_link_ratio = np.where(click_counts > 0, _reverse_segment_cumsum(indptr, top_clicks) / click_counts, 0.0)
+
+	# SIS: the target of each suffix is the last article of the path, whose occurrences are not scored
+	target_ids = np.append(article_ids, 0)[np.maximum(indptr[1:] - 1, 0)]
+	similarity_indptr, similarities = similarities_from_arrays(path_arrays, target_ids)
+	is_scored = article_ids != np.repeat(target_ids, lengths)
+	# Position in the similarities of the first scored step of each suffix
+	first_scored = np.cumsum(is_scored) - is_scored
+	suffix_sis = np.append(_suffix_spearman(similarity_indptr, similarities), 1.0)
+	semantic_increase_score = np.where(
+		first_scored < similarity_indptr[1:][segments], suffix_sis[np.minimum(first_scored, len(similarities))], 1.0
+	)
+
+	return pd.DataFrame(
+		dict(
+			rank=rank,
+			hub_usage_ratio=hub_usage_ratio,
+			top_link_ratio=top_link_ratio,
+			semantic_increase_score=semantic_increase_score,
+		),
+		index=path_arrays.index[segments],
+	)
@@ -0,0 +1,36 @@
+import multiprocessing
+import sqlite3
+
+from src.utils.cache import SimilarityCache
+
+_cache = None
+
+
+def _compute_in_worker(i: int) -> int:
+	# Runs in a forked process, whose connection is inherited from the parent
+	_cache.get_or_compute(i, i + 1, lambda: i / 10)
+	_cache.flush()
+	return i
+
+
+def test_similarity_cache_spills_from_forked_workers(tmp_path):
+	global _cache
+	spill_path = tmp_path / "similarities.sqlite"
+	_cache = SimilarityCache(1 << 20, spill_path)
+	_cache.get_or_compute(0, 1, lambda: 0.0)
+	_cache.flush()
+
+	# The parent still has a pending value when the workers are forked, only the parent writes it
+	_cache.get_or_compute(100, 101, lambda: 10.0)
+	with multiprocessing.get_context("fork").Pool(2) as pool:
+		assert pool.map(_compute_in_worker, range(1, 9)) == list(range(1, 9))
+	with sqlite3.connect(spill_path) as connection:
+		keys = {key for (key,) in connection.execute("SELECT key FROM similarities")}
+	assert keys == {SimilarityCache.key(i, i + 1) for i in range(9)}
+	_cache.flush()
+
+	# A new cache only finds the values on disk
+	cache = SimilarityCache(1 << 20, spill_path)
+	for i in [0, *range(1, 9), 100]:
+		assert cache.get_or_compute(i + 1, i, lambda: None) == i / 10
+	assert cache.disk_hits == 10
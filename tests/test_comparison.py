@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.strategies import comparison
+from src.utils.strategies.comparison import STRATEGY_SCORES, build_comparison_df, sweep_strategy_thresholds
+
+
+def _scores(rng: np.random.Generator, n_paths: int, finished: bool) -> pd.DataFrame:
+	# Continuous strategy scores like the ones of `compute_comparison_scores`, with some NaN scores
+	scores = pd.DataFrame(
+		{
+			"source": "A",
+			"target": "B",
+			"path": [["A", "B"]] * n_paths,
+			"time": rng.integers(10, 500, n_paths),
+			"finished": finished,
+			"link_percentage": rng.random(n_paths),
+			"num_clicks": rng.integers(4, 20, n_paths),
+			"semantic_increase_score": rng.random(n_paths),
+			"max_generality": rng.random(n_paths) < 0.5,
+			"hub_usage_ratio": rng.random(n_paths),
+			"backtrack_ratio": rng.random(n_paths) * 0.3,
+		}
+	)
+	for column in ["link_percentage", "semantic_increase_score"]:
+		scores.loc[rng.random(n_paths) < 0.2, column] = np.nan
+	return scores
+
+
+def test_threshold_sweep_matches_comparison_flags(monkeypatch):
+	rng = np.random.default_rng(0)
+	finished, unfinished = _scores(rng, 200, True), _scores(rng, 150, False)
+	monkeypatch.setattr(comparison, "compute_comparison_scores", lambda graph_data, top_hubs: (finished, unfinished))
+
+	grid = np.array([0.0, 0.05, 0.1, 0.3, 0.5, 0.8, 1.0])
+	sweep = sweep_strategy_thresholds(finished, unfinished, {flag: grid for flag in STRATEGY_SCORES}).set_index(
+		["strategy", "threshold"]
+	)
+
+	arguments = {
+		"top_link_usage": "threshold_link",
+		"semantic": "threshold_semantic",
+		"hub_usage": "threshold_hub",
+		"backtrack": "threshold_backtrack",
+	}
+	for flag, argument in arguments.items():
+		for threshold in grid:
+			flagged_finished, flagged_unfinished = build_comparison_df(None, **{argument: threshold})
+			selected = flagged_finished[flagged_finished[flag]]
+			row = sweep.loc[(flag, threshold)]
+
+			assert row["num_games"] == len(selected) + flagged_unfinished[flag].sum()
+			assert row["num_finished"] == len(selected)
+			if len(selected):
+				assert row["mean_time"] == pytest.approx(selected["time"].mean())
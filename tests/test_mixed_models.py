@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.formula.api as smf
+
+from src.utils.mixed_models import random_intercept_from_formula
+
+FORMULA = "y ~ x1 + x2 + x1:x2"
+
+
+@pytest.fixture(scope="module")
+def data() -> pd.DataFrame:
+	"""Synthetic data with a random intercept per group and unbalanced groups."""
+	rng = np.random.default_rng(0)
+	n_rows, n_groups = 6000, 300
+	groups = rng.integers(n_groups, size=n_rows)
+	x1, x2 = rng.normal(size=n_rows), rng.normal(size=n_rows)
+	intercepts = rng.normal(scale=2.0, size=n_groups)
+	y = 1.0 + 0.5 * x1 - 0.3 * x2 + 0.2 * x1 * x2 + intercepts[groups] + rng.normal(scale=3.0, size=n_rows)
+	return pd.DataFrame({"y": y, "x1": x1, "x2": x2, "group": [f"g{group}" for group in groups]})
+
+
+@pytest.mark.parametrize("reml", [True, False])
+def test_random_intercept_matches_statsmodels(data, reml):
+	expected = smf.mixedlm(FORMULA, data=data, groups=data["group"]).fit(reml=reml)
+	result = random_intercept_from_formula(FORMULA, data, "group", reml=reml)
+
+	# statsmodels stops its optimization earlier, the tolerances are about 20 times the observed differences
+	assert result.converged
+	np.testing.assert_allclose(result.fe_params, expected.fe_params, rtol=0, atol=1e-5)
+	np.testing.assert_allclose(result.bse_fe, expected.bse_fe, rtol=5e-4)
+	np.testing.assert_allclose(
+		result.pvalues[expected.fe_params.index], expected.pvalues[expected.fe_params.index], rtol=1e-3, atol=1e-12
+	)
+	np.testing.assert_allclose(result.scale, expected.scale, rtol=1e-4)
+	np.testing.assert_allclose(result.cov_re, expected.cov_re, rtol=2e-3)
+	np.testing.assert_allclose(result.llf, expected.llf, rtol=0, atol=1e-5)
+
+	random_effects = pd.DataFrame(result.random_effects).T
+	expected_random_effects = pd.DataFrame(expected.random_effects).T
+	np.testing.assert_allclose(random_effects.loc[expected_random_effects.index], expected_random_effects, rtol=0, atol=1e-3)
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from src.utils.data.paths import PathArrays
+from src.utils.strategies import comparison, hub_focused_strategy, link_strategy, semantic_strategy
+from src.utils.strategies.backtrack_strategy import compute_backtrack_ratio
+from src.utils.strategies.hub_focused_strategy import compute_hub_usage_ratio
+from src.utils.strategies.link_strategy import top_link_ratio
+from src.utils.strategies.semantic_strategy import semantic_increase_scores
+
+N_ARTICLES = 60
+
+
+def _random_path(rng: np.random.Generator, names: list[str]) -> list[str]:
+	# A path ending on a random article, with '<' steps that always match a previous article
+	path = []
+	for _ in range(rng.integers(1, 20)):
+		if len(path) - 2 * path.count("<") > 1 and rng.random() < 0.15:
+			path.append("<")
+		else:
+			path.append(names[rng.integers(N_ARTICLES)])
+	return path + [names[rng.integers(N_ARTICLES)]]
+
+
+def _clear_caches() -> None:
+	for getter in [
+		comparison.get_strategies_scores,
+		hub_focused_strategy.get_top_hubs,
+		hub_focused_strategy._get_graph_hub_mask,
+		link_strategy.build_link_positions,
+		semantic_strategy.load_target_similarity_matrix,
+	]:
+		getter.cache_clear()
+
+
+@pytest.fixture
+def graph_data(monkeypatch, tmp_path):
+	"""Synthetic graph data and article vectors, the derived files are written to a temporary directory."""
+	rng = np.random.default_rng(0)
+	names = [f"Article_{i}" for i in range(N_ARTICLES)]
+	paths = [_random_path(rng, names) for _ in range(500)]
+	paths_finished = pd.DataFrame(
+		{
+			"path": paths,
+			"target": [path[-1] for path in paths],
+			"duration_in_seconds": rng.integers(10, 1200, len(paths)),
+		},
+		index=rng.permutation(len(paths)) * 3,
+	)
+	data = {
+		"articles": pd.DataFrame({"name": names}),
+		"top_200_hubs": [(name, 0.0) for name in names[:8]],
+		"paths_finished": paths_finished,
+		"paths_finished_arrays": PathArrays.from_paths(paths_finished["path"], names),
+		"paths_unfinished": paths_finished.iloc[:0],
+	}
+
+	# Links with a relative position, some of them without any position
+	links = {}
+	for name in names:
+		targets = rng.choice(N_ARTICLES, size=20, replace=False)
+		links[name] = [
+			dict(title=names[target], position=position / 20) if position % 7 else dict(title=names[target])
+			for position, target in enumerate(targets)
+		]
+
+	vectors = normalize(sp.random(N_ARTICLES, 200, density=0.1, random_state=1, format="csr"), norm="l2").tocsr()
+	article_to_index = {name: i for i, name in enumerate(names)}
+
+	monkeypatch.chdir(tmp_path)
+	for module in [comparison, hub_focused_strategy, semantic_strategy]:
+		monkeypatch.setattr(module, "load_graph_data", lambda: data)
+	monkeypatch.setattr(link_strategy, "build_link_order", lambda: links)
+	monkeypatch.setattr(semantic_strategy, "build_normalized_tf_idf", lambda: (vectors, article_to_index))
+	monkeypatch.setattr(semantic_strategy, "tf_idf_model_key", lambda: "synthetic")
+	_clear_caches()
+	yield data
+	_clear_caches()
+	comparison.set_n_workers(1)
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_strategies_scores_match_per_path_scores(graph_data, n_workers):
+	# Previous implementation, scoring the paths one by one
+	expected = graph_data["paths_finished"][["path", "target", "duration_in_seconds"]].copy()
+	expected = expected[expected["path"].apply(len) > 2]
+	expected = expected[expected["duration_in_seconds"] < 1000]
+	expected["semantic_increase_score"] = semantic_increase_scores(expected["path"].tolist())
+	expected["top_links_ratio"] = expected["path"].apply(top_link_ratio)
+	expected["backtrack_ratio"] = expected["path"].apply(compute_backtrack_ratio)
+	expected["hub_ratio"] = expected["path"].apply(compute_hub_usage_ratio)
+
+	comparison.set_n_workers(n_workers)
+	pd.testing.assert_frame_equal(comparison.get_strategies_scores(), expected, check_exact=True)
+
+
+def test_target_similarity_matrix_matches_cosine_products(graph_data):
+	vectors, article_to_index = semantic_strategy.build_normalized_tf_idf()
+	matrix, target_to_row = semantic_strategy.load_target_similarity_matrix()
+	targets = sorted(target_to_row, key=target_to_row.get)
+	expected = (vectors[[article_to_index[target] for target in targets]] @ vectors.T).toarray()
+
+	assert matrix.dtype == np.float64
+	np.testing.assert_array_equal(matrix, expected)
+
+	# The float32 copy stays within its rounding error of the float64 products
+	matrix_32, _ = semantic_strategy.load_target_similarity_matrix(np.float32)
+	np.testing.assert_allclose(matrix_32, expected, rtol=0, atol=1e-6)
+
+
+def test_target_similarity_matrix_is_rebuilt_for_new_targets(graph_data):
+	paths_finished = graph_data["paths_finished"]
+	graph_data["paths_finished"] = paths_finished[paths_finished["target"] != "Article_0"]
+	_, target_to_row = semantic_strategy.load_target_similarity_matrix()
+	assert "Article_0" not in target_to_row
+
+	graph_data["paths_finished"] = paths_finished
+	semantic_strategy.load_target_similarity_matrix.cache_clear()
+	_, target_to_row = semantic_strategy.load_target_similarity_matrix()
+	assert "Article_0" in target_to_row